@@ -1,7 +1,5 @@
 # backend/api/main.py
 
-import uuid
-import base64
 import numpy as np
 from datetime import datetime
 from typing import List, Optional, Literal
@@ -24,12 +22,14 @@ from core.database import get_database, startup_db_client, shutdown_db_client #
 
 # Import ML functions
 from ml.embeddings import get_face_embeddings, get_image_embedding, get_text_embedding, calculate_fused_score
-from ml.matcher import run_matching_job, initialize_faiss_index, faiss_indexes
+from ml.matcher import run_matching_job, start_matching_workers, stop_matching_workers, load_or_create_faiss_index, faiss_indexes, faiss_index_name, FAISS_INDEX_DIMENSIONS, REPORT_TYPES
 # from ml.speech_to_text import transcribe_audio # Temporarily disabled speech-to-text functionality
 from core.websocket_manager import manager # Import the WebSocket manager
+from core.logging_config import setup_logging
 
 # Load environment variables
 load_dotenv()
+setup_logging()
 
 # Existing FastAPI app instance
 app = FastAPI(
@@ -57,13 +57,15 @@ app.add_middleware(
 async def startup():
     await startup_db_client() # Call MongoDB startup
     print("Initializing FAISS indexes...")
-    faiss_indexes["face"] = initialize_faiss_index(512) # DeepFace ArcFace: 512
-    faiss_indexes["image"] = initialize_faiss_index(512) # CLIP: 512
-    faiss_indexes["text"] = initialize_faiss_index(384) # SBERT: 384
+    for modality, dimension in FAISS_INDEX_DIMENSIONS.items():
+        for report_type in REPORT_TYPES:
+            load_or_create_faiss_index(faiss_index_name(modality, report_type), dimension) # Reuse persisted indexes across restarts
     print("FAISS indexes initialized.")
+    start_matching_workers()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await stop_matching_workers()
     await shutdown_db_client() # Call MongoDB shutdown
 
 # WebSocket endpoint
@@ -1,26 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Form, Cookie
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from typing import Optional, Annotated                                                                                                                                                                                                                                                                                                                                                          
 from pydantic import BaseModel # Added BaseModel import
 from fastapi.responses import JSONResponse # Import JSONResponse for setting cookies
 from fastapi import Request # Import Request for checking hostname
+import asyncio # Import asyncio to run password hashing off the event loop
+import logging
 
 from models.schemas import UserSchema, UserRegisterSchema, PyObjectId # Re-added PyObjectId
 from core.database import get_database # Re-added MongoDB database import
+import core.database # Read users_contact_unique at call time; ensure_indexes sets it at startup
 from core.security import (
-    verify_password, get_password_hash,
+    verify_and_update_password, get_password_hash, hash_refresh_token, password_hash_executor,
     create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES,
     create_refresh_token, REFRESH_TOKEN_EXPIRE_MINUTES, decode_refresh_token
 )
 from bson import ObjectId # Re-added MongoDB ObjectId import
 from core.security import get_current_user # Re-added custom JWT current user
-from pymongo import MongoClient # Re-added MongoDB client import
+from pymongo import MongoClient, ReturnDocument # Re-added MongoDB client import
+from pymongo.errors import DuplicateKeyError
 
 # from core.supabase import get_supabase_client # Removed Supabase imports
 # from supabase import Client # Removed Client
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class Token(BaseModel):
     access_token: str
@@ -29,8 +34,11 @@ class Token(BaseModel):
 class UserInDB(UserSchema):
     hashed_password: str
 
+# Only fetch the fields UserInDB actually reads
+USER_IN_DB_PROJECTION = {(field.alias or name): 1 for name, field in UserInDB.model_fields.items()}
+
 async def get_user(contact: str, database: MongoClient) -> Optional[UserInDB]:
-    user_data = await database["users"].find_one({"contact": contact})
+    user_data = await database["users"].find_one({"contact": contact}, projection=USER_IN_DB_PROJECTION)
     if user_data:
         return UserInDB(**user_data, id=str(user_data["_id"]))
     return None
@@ -39,28 +47,43 @@ async def authenticate_user(contact: str, password: str, database: MongoClient)
     user = await get_user(contact, database)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await asyncio.get_running_loop().run_in_executor(
+        password_hash_executor, verify_and_update_password, password, user.hashed_password
+    )
+    if not verified:
         return None
+    if new_hash:
+        # Transparently migrate legacy bcrypt hashes to Argon2id on successful login
+        await database["users"].update_one({"_id": ObjectId(user.id)}, {"$set": {"hashed_password": new_hash}})
     return user
 
 
 @router.post("/auth/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 async def register_user(user_in: UserRegisterSchema, database: MongoClient = Depends(get_database)):
-    existing_user = await database["users"].find_one({"contact": user_in.contact})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Contact already registered"
-        )
-    
-    hashed_password = get_password_hash(user_in.password)
+    if not core.database.users_contact_unique:
+        # Existing duplicate contacts kept the unique index from being built, so check explicitly instead
+        existing_user = await database["users"].find_one({"contact": user_in.contact}, projection={"_id": 1})
+        if existing_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Contact already registered"
+            )
+
+    hashed_password = await asyncio.get_running_loop().run_in_executor(password_hash_executor, get_password_hash, user_in.password)
     user_data = user_in.model_dump()
     user_data["hashed_password"] = hashed_password
     del user_data["password"] # Remove plain password before saving
     
-    new_user = await database["users"].insert_one(user_data)
-    created_user = await database["users"].find_one({"_id": new_user.inserted_id})
-    return UserSchema.model_validate(created_user)
+    # Normally the unique index on contact rejects duplicates, with no separate existence check
+    try:
+        await database["users"].insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Contact already registered"
+        )
+    # insert_one sets _id on user_data in place, so there's no need to read the user back
+    return UserSchema.model_validate(user_data)
 
 @router.post("/auth/token", response_model=Token)
 async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), database: MongoClient = Depends(get_database)):
@@ -81,8 +104,8 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
         data={"sub": user.contact}, expires_delta=refresh_token_expires
     )
 
-    # Hash the refresh token before storing in DB
-    hashed_refresh_token = get_password_hash(refresh_token) # Re-use password hash function for simplicity
+    # Store only a peppered HMAC of the refresh token in DB
+    hashed_refresh_token = hash_refresh_token(refresh_token)
 
     # Store hashed refresh token in user's document
     await database["users"].update_one(
@@ -110,32 +133,25 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
 @router.post("/auth/refresh", response_model=Token)
 async def refresh_access_token(
     request: Request,
-    refresh_token_cookie: Annotated[str | None, Header(alias="Cookie")] = None,
+    refresh_token_cookie: Annotated[str | None, Cookie(alias="refresh_token")] = None,
     refresh_token_header: Annotated[str | None, Header(alias="X-Refresh-Token")] = None, # Re-add custom header for local dev fallback
     database: MongoClient = Depends(get_database)
 ):
     is_local = request.url.hostname == "localhost"
     
-    # Add debug prints to see raw headers
-    print(f"[Backend Debug] Refresh Request - Raw Cookie Header: {refresh_token_cookie}")
-    print(f"[Backend Debug] Refresh Request - X-Refresh-Token Header: {refresh_token_header}")
+    logger.debug("Refresh request - cookie present: %s, X-Refresh-Token header present: %s",
+                 refresh_token_cookie is not None, refresh_token_header is not None)
     
-    refresh_token_value = None
     # 1. Try to get from HttpOnly cookie (primary method)
-    if refresh_token_cookie:
-        for cookie_pair in refresh_token_cookie.split('; '):
-            if cookie_pair.strip().startswith('refresh_token='):
-                refresh_token_value = cookie_pair.strip().split('=', 1)[1]
-                print(f"[Backend Debug] Extracted refresh_token from cookie: {refresh_token_value[:10]}...")
-                break
+    refresh_token_value = refresh_token_cookie
     
     # 2. Fallback to custom header for local development if cookie not found
     if not refresh_token_value and is_local and refresh_token_header:
         refresh_token_value = refresh_token_header
-        print(f"[Backend Debug] Extracted refresh_token from X-Refresh-Token header (local dev fallback): {refresh_token_value[:10]}...")
+        logger.debug("Using refresh_token from X-Refresh-Token header (local dev fallback)")
     
     if not refresh_token_value:
-        print("[Backend Debug] No refresh token found from cookie or header.")
+        logger.debug("No refresh token found from cookie or header.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token not provided",
@@ -144,7 +160,7 @@ async def refresh_access_token(
     
     payload = decode_refresh_token(refresh_token_value)
     if payload is None:
-        print("[Backend Debug] Invalid refresh token: payload is None.")
+        logger.debug("Invalid refresh token: payload is None.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token",
@@ -152,16 +168,29 @@ async def refresh_access_token(
         )
     contact: str = payload.get("sub")
     if contact is None:
-        print("[Backend Debug] Invalid refresh token payload: no 'sub' field.")
+        logger.debug("Invalid refresh token payload: no 'sub' field.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token payload",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = await get_user(contact, database)
-    if not user or not user.hashed_refresh_token or not verify_password(refresh_token_value, user.hashed_refresh_token):
-        print("[Backend Debug] Validation failed: User not found, no hashed token, or token mismatch.")
+    # Issue a new refresh token (rotate refresh tokens)
+    new_refresh_token_expires = timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
+    new_refresh_token = create_refresh_token(
+        data={"sub": contact}, expires_delta=new_refresh_token_expires
+    )
+    hashed_new_refresh_token = hash_refresh_token(new_refresh_token)
+
+    # Validate the presented token and rotate it in a single round-trip
+    user = await database["users"].find_one_and_update(
+        {"hashed_refresh_token": hash_refresh_token(refresh_token_value)},
+        {"$set": {"hashed_refresh_token": hashed_new_refresh_token}},
+        projection={"contact": 1, "role": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if user is None:
+        logger.debug("Refresh validation failed: user not found, no hashed token, or token mismatch.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
@@ -171,19 +200,7 @@ async def refresh_access_token(
     # Issue new access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = create_access_token(
-        data={"sub": user.contact, "role": user.role}, expires_delta=access_token_expires
-    )
-
-    # Issue a new refresh token (rotate refresh tokens)
-    new_refresh_token_expires = timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
-    new_refresh_token = create_refresh_token(
-        data={"sub": user.contact}, expires_delta=new_refresh_token_expires
-    )
-    hashed_new_refresh_token = get_password_hash(new_refresh_token)
-
-    await database["users"].update_one(
-        {"_id": ObjectId(user.id)},
-        {"$set": {"hashed_refresh_token": hashed_new_refresh_token}}
+        data={"sub": user["contact"], "role": user["role"]}, expires_delta=access_token_expires
     )
 
     response = JSONResponse(content={"access_token": new_access_token, "token_type": "bearer", "refresh_token": new_refresh_token})
@@ -204,35 +221,27 @@ async def refresh_access_token(
 @router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
 async def logout_user(
     request: Request, # Add Request to get hostname
-    refresh_token_cookie: Annotated[str | None, Header(alias="Cookie")] = None,
+    refresh_token_cookie: Annotated[str | None, Cookie(alias="refresh_token")] = None,
     refresh_token_header: Annotated[str | None, Header(alias="X-Refresh-Token")] = None, # Re-add custom header for local dev fallback
     database: MongoClient = Depends(get_database),
 ):
     is_local = request.url.hostname == "localhost"
     
-    refresh_token = None
-    if refresh_token_cookie:
-        for cookie_pair in refresh_token_cookie.split('; '):
-            if cookie_pair.strip().startswith('refresh_token='):
-                refresh_token = cookie_pair.strip().split('=', 1)[1]
-                break
+    refresh_token = refresh_token_cookie
     
     # Fallback to custom header for local development if cookie not found
     if not refresh_token and is_local and refresh_token_header:
         refresh_token = refresh_token_header
-        print(f"[Backend Debug] Logout: Extracted refresh_token from X-Refresh-Token header (local dev fallback): {refresh_token[:10]}...")
+        logger.debug("Logout: using refresh_token from X-Refresh-Token header (local dev fallback)")
 
     if refresh_token:
         payload = decode_refresh_token(refresh_token)
         if payload and "sub" in payload:
-            contact: str = payload["sub"]
-            user = await get_user(contact, database)
-            if user and user.hashed_refresh_token and verify_password(refresh_token, user.hashed_refresh_token):
-                # Invalidate refresh token by removing it from the database
-                await database["users"].update_one(
-                    {"_id": ObjectId(user.id)},
-                    {"$set": {"hashed_refresh_token": None}}
-                )
+            # Invalidate refresh token by removing it from the database, only if it matches
+            await database["users"].update_one(
+                {"hashed_refresh_token": hash_refresh_token(refresh_token)},
+                {"$set": {"hashed_refresh_token": None}}
+            )
     
     response = JSONResponse(content={})
     
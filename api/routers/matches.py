@@ -1,12 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Query
 from typing import List, Optional, Literal
-import base64
 import asyncio # Import asyncio for background tasks
 
-from models.schemas import MatchSchema, ReportSchema, PyObjectId # Re-added PyObjectId
-from core.database import get_database, get_image_from_gridfs # Re-added MongoDB imports
-from ml.matcher import run_matching_job
-from pymongo import MongoClient # Re-added MongoDB client import
+from models.schemas import MatchSchema, ModalityScores, ReportSchema, PyObjectId # Re-added PyObjectId
+from core.database import get_database, get_image_from_gridfs, valid_report_oid, valid_match_oid # Re-added MongoDB imports
+from ml.matcher import enqueue_matching_job
+from pymongo import MongoClient, ReturnDocument # Re-added MongoDB client import
 from bson import ObjectId # Re-added MongoDB ObjectId import
 
 # from core.supabase import get_supabase_client, get_file_from_supabase_storage # Removed Supabase imports
@@ -15,78 +14,82 @@ from bson import ObjectId # Re-added MongoDB ObjectId import
 
 router = APIRouter()
 
+# Only fetch the fields MatchSchema actually reads
+MATCH_PROJECTION = {(field.alias or name): 1 for name, field in MatchSchema.model_fields.items()}
+
 @router.post("/match/run/{report_id}") # Changed to path parameter
-async def run_match(report_id: str, database: MongoClient = Depends(get_database)): # Reverted to MongoDB client
-    if not ObjectId.is_valid(report_id):
-        raise HTTPException(status_code=400, detail="Invalid report ID format")
-    
+async def run_match(
+    report_id: str,
+    report_oid: ObjectId = Depends(valid_report_oid),
+    database: MongoClient = Depends(get_database) # Reverted to MongoDB client
+):
     # Fetch report data from MongoDB
-    report_data = await database["reports"].find_one({"_id": ObjectId(report_id)})
+    report_data = await database["reports"].find_one({"_id": report_oid})
 
     if not report_data:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    # Prepare data for matching job, converting GridFS IDs to base64 images
-    report_with_b64_images = ReportSchema.model_validate(report_data).model_dump()
-    report_with_b64_images["photo_urls"] = [] # Placeholder for base64 images
-    for file_id in report_data.get("photo_ids", []):
-        img_bytes = await get_image_from_gridfs(file_id)
-        if img_bytes:
-            report_with_b64_images["photo_urls"].append(base64.b64encode(img_bytes).decode("utf-8"))
+    # Prepare data for matching job with the raw photo bytes from GridFS
+    job_data = ReportSchema.model_validate(report_data).model_dump()
+    # Fetch all photos from GridFS concurrently
+    images = await asyncio.gather(*(get_image_from_gridfs(file_id) for file_id in report_data.get("photo_ids", [])))
+    job_data["photos"] = [img_bytes for img_bytes in images if img_bytes]
 
-    # Run matching job in the background
-    asyncio.create_task(run_matching_job(report_id, report_with_b64_images, database)) # Pass database client
+    # Queue matching job for the background workers
+    await enqueue_matching_job(report_id, job_data, database) # Pass database client
     return {"message": f"Matching process initiated for report {report_id}"}
 
 
 @router.get("/matches", response_model=List[MatchSchema])
 async def list_matches(
     status_filter: Optional[Literal["PENDING", "CONFIRMED_REUNITED", "FALSE_MATCH"]] = Query(None), # Changed Depends() to Query(None)
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of matches to return"),
+    before: Optional[str] = Query(None, description="Return matches older than this match ID (keyset pagination)"),
     database: MongoClient = Depends(get_database) # Reverted to MongoDB client dependency
 ):
     query = {}
     if status_filter:
         query["status"] = status_filter
+    if before:
+        if not ObjectId.is_valid(before):
+            raise HTTPException(status_code=400, detail="Invalid match ID format")
+        query["_id"] = {"$lt": ObjectId(before)}
     
-    matches = await database["matches"].find(query).to_list(1000)
-    return [MatchSchema.model_validate(match) for match in matches]
+    cursor = database["matches"].find(query, projection=MATCH_PROJECTION).sort("_id", -1).limit(limit)
+    # Match documents are written by the matcher itself, so skip re-validating each row
+    # (model_construct doesn't build nested models, so wrap the scores ourselves)
+    return [
+        MatchSchema.model_construct(**{**match, "scores": ModalityScores.model_construct(**match.get("scores", {}))})
+        async for match in cursor
+    ]
 
 @router.post("/matches/{match_id}/confirm", response_model=MatchSchema)
-async def confirm_match(match_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(match_id):
-        raise HTTPException(status_code=400, detail="Invalid match ID format")
-
-    update_result = await database["matches"].update_one(
-        {"_id": ObjectId(match_id)},
-        {"$set": {"status": "CONFIRMED_REUNITED"}}
+async def confirm_match(match_oid: ObjectId = Depends(valid_match_oid), database: MongoClient = Depends(get_database)):
+    updated_match = await database["matches"].find_one_and_update(
+        {"_id": match_oid},
+        {"$set": {"status": "CONFIRMED_REUNITED"}},
+        return_document=ReturnDocument.AFTER
     )
-    if update_result.modified_count == 0:
+    if updated_match is None:
         raise HTTPException(status_code=404, detail="Match not found or not updated")
     
-    updated_match = await database["matches"].find_one({"_id": ObjectId(match_id)})
     return MatchSchema.model_validate(updated_match)
 
 @router.post("/matches/{match_id}/flag-false", response_model=MatchSchema)
-async def flag_false_match(match_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(match_id):
-        raise HTTPException(status_code=400, detail="Invalid match ID format")
-
-    update_result = await database["matches"].update_one(
-        {"_id": ObjectId(match_id)},
-        {"$set": {"status": "FALSE_MATCH"}}
+async def flag_false_match(match_oid: ObjectId = Depends(valid_match_oid), database: MongoClient = Depends(get_database)):
+    updated_match = await database["matches"].find_one_and_update(
+        {"_id": match_oid},
+        {"$set": {"status": "FALSE_MATCH"}},
+        return_document=ReturnDocument.AFTER
     )
-    if update_result.modified_count == 0:
+    if updated_match is None:
         raise HTTPException(status_code=404, detail="Match not found or not updated")
     
-    updated_match = await database["matches"].find_one({"_id": ObjectId(match_id)})
     return MatchSchema.model_validate(updated_match)
 
 @router.get("/matches/{match_id}", response_model=MatchSchema)
-async def get_match_by_id(match_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(match_id):
-        raise HTTPException(status_code=400, detail="Invalid match ID format")
-
-    match = await database["matches"].find_one({"_id": ObjectId(match_id)})
+async def get_match_by_id(match_oid: ObjectId = Depends(valid_match_oid), database: MongoClient = Depends(get_database)):
+    match = await database["matches"].find_one({"_id": match_oid})
     if match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return MatchSchema.model_validate(match)
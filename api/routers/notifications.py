@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Form, status
 from typing import Optional, Literal
-from datetime import datetime
+from datetime import datetime, timezone
 from pymongo import MongoClient # Re-added MongoDB client import
 from bson import ObjectId # Re-added MongoDB ObjectId import
 
@@ -22,7 +22,7 @@ async def send_mock_notification(
     Simulates sending a notification (SMS/Call) and logs the attempt to MongoDB.
     """
     notification_entry_data = {
-        "timestamp": datetime.utcnow(),
+        "timestamp": datetime.now(timezone.utc),
         "match_id": ObjectId(match_id) if match_id and ObjectId.is_valid(match_id) else None,
         "report_id": ObjectId(report_id) if report_id and ObjectId.is_valid(report_id) else None,
         "recipient": recipient,
@@ -31,13 +31,9 @@ async def send_mock_notification(
         "status": "SIMULATED_SENT"
     }
     
-    insert_result = await database["notification_logs"].insert_one(notification_entry_data)
-
-    if insert_result.inserted_id:
-        created_log_entry = await database["notification_logs"].find_one({"_id": insert_result.inserted_id})
-        notification_entry = NotificationLogEntry.model_validate(created_log_entry)
-        print(f"Simulated {notification_type} notification sent to {recipient}: {message}")
-        print(f"Notification Log ID: {notification_entry.id}")
-        return notification_entry
-    else:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to log notification")
+    # insert_one sets _id on the document in place, so build the response from it instead of reading it back
+    await database["notification_logs"].insert_one(notification_entry_data)
+    notification_entry = NotificationLogEntry.model_validate(notification_entry_data)
+    print(f"Simulated {notification_type} notification sent to {recipient}: {message}")
+    print(f"Notification Log ID: {notification_entry.id}")
+    return notification_entry
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, status, Query
-from typing import List, Optional, Literal
-import base64
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, status, Query, Request
+from fastapi.exceptions import RequestValidationError
+from typing import List, Optional, Literal, Tuple
 import uuid # Import uuid for generating unique file names
-from datetime import datetime # Added datetime import
-from fastapi.responses import Response # Import Response for serving images
-import asyncio # Import asyncio for create_task
+from datetime import datetime, timezone # Added datetime import
+from fastapi.responses import Response, StreamingResponse # Import Response for serving images
+import asyncio # Import asyncio for concurrent photo uploads
 
-from models.schemas import ReportSchema, PersonSchema, ItemSchema, PyObjectId # Re-added PyObjectId
-from core.database import get_database, store_image_in_gridfs, get_image_from_gridfs # Re-added MongoDB database and GridFS imports
-from ml.matcher import run_matching_job
+from pydantic import TypeAdapter, ValidationError
+
+from models.schemas import ReportSchema, ReportCreateSchema, PersonSchema, ItemSchema, PyObjectId # Re-added PyObjectId
+from core.database import get_database, store_image_in_gridfs, get_gridfs_bucket, valid_report_oid, valid_file_oid # Shared bucket created once at startup
+from ml.matcher import enqueue_matching_job
 # from ml.speech_to_text import transcribe_audio # Temporarily disabled speech-to-text functionality
 from pymongo import MongoClient # Re-added MongoDB client import
 from bson import ObjectId # Re-added MongoDB ObjectId import
-from gridfs import GridFSBucket # Added GridFSBucket import
+from gridfs.errors import NoFile
 from core.security import get_current_user # Import to get current user
 from models.schemas import UserSchema # Import UserSchema for type hinting
 
@@ -21,47 +23,88 @@ from models.schemas import UserSchema # Import UserSchema for type hinting
 
 router = APIRouter()
 
+PHOTO_UPLOAD_CONCURRENCY = 8 # Max photos of one report uploaded to GridFS at once
+MAX_PHOTO_BYTES = 10 * 1024 * 1024 # Per-photo upload cap
+ALLOWED_IMAGE_TYPES = frozenset({"image/jpeg", "image/png"})
+MAX_BULK_REPORTS = 500 # Max reports accepted by one /reports/bulk call
+REPORT_IMAGE_MAX_AGE_SECONDS = 300 # Browser-only caching; photos of people must not linger in shared caches after deletion
+
+# Only fetch the stored fields ReportSchema reads; photo_urls is derived from photo_ids. Reports are stored
+# under a mix of field names and aliases (description_text vs subject/refs), so project both spellings
+REPORT_PROJECTION = {
+    key: 1
+    for name, field in ReportSchema.model_fields.items() if name != "photo_urls"
+    for key in {name, field.alias or name}
+}
+REPORT_LIST_ADAPTER = TypeAdapter(List[ReportSchema]) # Built once, validates whole pages in pydantic-core
+REPORT_CREATE_LIST_ADAPTER = TypeAdapter(List[ReportCreateSchema]) # Parses and validates bulk bodies straight from JSON bytes
+# The bulk body is read by hand, so describe it for the OpenAPI docs; LocationDataSchema is already a component
+REPORT_CREATE_ITEM_SCHEMA = ReportCreateSchema.model_json_schema(ref_template="#/components/schemas/{model}")
+REPORT_CREATE_ITEM_SCHEMA.pop("$defs", None)
+
 # SUPABASE_REPORT_PHOTOS_BUCKET = "report_photos" # Removed Supabase bucket definition
 
-def get_gridfs_bucket():
-    """Helper function to get the GridFS bucket."""
-    return GridFSBucket(get_database().client.gridfs_db)
+async def _read_photo(photo: UploadFile) -> bytes:
+    # Read the spooled upload once, into a single buffer; one byte past the cap is enough to detect an oversized photo
+    photo_bytes = await photo.read(MAX_PHOTO_BYTES + 1)
+    # The declared size can lie, so enforce the cap on what is actually read
+    if len(photo_bytes) > MAX_PHOTO_BYTES:
+        raise HTTPException(status_code=413, detail="Photo exceeds the maximum allowed size.")
+    return photo_bytes
 
-@router.post("/reports/lost", response_model=ReportSchema)
-async def create_lost_report(
-    subject_type: Literal["PERSON", "ITEM"] = Form(..., alias="subject"),
-    ref_ids_str: str = Form(..., alias="refs", description="Comma-separated IDs of person/item"),
-    description_text: str = Form(..., alias="desc_text"),
-    language: str = Form(..., alias="lang"),
-    latitude: float = Form(..., description="Latitude of the location"),
-    longitude: float = Form(..., description="Longitude of the location"),
-    location_description: Optional[str] = Form(None, alias="location_desc", description="Human-readable description of the location"),
-    photos: Optional[List[UploadFile]] = File(None), # Made photos optional
-    database: MongoClient = Depends(get_database), # Reverted to MongoDB client dependency
-    current_user: UserSchema = Depends(get_current_user), # Inject current user
-    # Person-specific details
-    is_child: Optional[bool] = Form(None, description="Indicates if the person is a child"),
-    height_cm: Optional[float] = Form(None, description="Height in centimeters"),
-    weight_kg: Optional[float] = Form(None, description="Weight in kilograms"),
-    identifying_features: Optional[str] = Form(None, description="Distinctive features"),
-    clothing_description: Optional[str] = Form(None, description="Description of clothing"),
-):
+async def _store_photo(photo: UploadFile, photo_bytes: bytes, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        # Generate a unique filename or use a simpler one if GridFS handles IDs
+        filename = f"{uuid.uuid4().hex}-{photo.filename}"
+        return await store_image_in_gridfs(photo_bytes, filename, photo.content_type)
+
+async def _store_photos(photos: Optional[List[UploadFile]]) -> Tuple[List[str], List[bytes]]:
+    """Validates and concurrently stores report photos in GridFS, returning their IDs and raw bytes in order."""
+    if not photos:
+        return [], []
+    for photo in photos:
+        if photo.content_type not in ALLOWED_IMAGE_TYPES:
+            raise HTTPException(status_code=400, detail="Only JPEG or PNG images are allowed.")
+        if photo.size is not None and photo.size > MAX_PHOTO_BYTES:
+            raise HTTPException(status_code=413, detail="Photo exceeds the maximum allowed size.")
+    # Every photo is read and size-checked before any is stored, so a rejected upload leaves no orphans in GridFS
+    photo_bytes = [await _read_photo(photo) for photo in photos]
+    semaphore = asyncio.Semaphore(PHOTO_UPLOAD_CONCURRENCY)
+    photo_ids = await asyncio.gather(*(_store_photo(photo, data, semaphore) for photo, data in zip(photos, photo_bytes)))
+    return list(photo_ids), photo_bytes
+
+def _matching_job_data(report: dict, photos: List[bytes]) -> dict:
+    """Builds the payload run_matching_job expects from a stored report and its raw photo bytes."""
+    job_data = ReportSchema.model_validate(report).model_dump()
+    job_data["photos"] = photos
+    return job_data
+
+async def _create_report(
+    report_type: Literal["LOST", "FOUND"],
+    subject_type: Literal["PERSON", "ITEM"],
+    ref_ids_str: str,
+    description_text: str,
+    language: str,
+    latitude: float,
+    longitude: float,
+    location_description: Optional[str],
+    photos: Optional[List[UploadFile]],
+    database: MongoClient,
+    current_user: UserSchema,
+    is_child: Optional[bool],
+    height_cm: Optional[float],
+    weight_kg: Optional[float],
+    identifying_features: Optional[str],
+    clothing_description: Optional[str],
+) -> ReportSchema:
+    """Stores a report's photos and document, then queues it for matching. Shared by the lost and found endpoints."""
     ref_ids = [rid.strip() for rid in ref_ids_str.split(',')]
     
     # Store photos in GridFS
-    photo_ids = []
-    if photos:
-        for photo in photos:
-            if photo.content_type not in ["image/jpeg", "image/png"]:
-                raise HTTPException(status_code=400, detail="Only JPEG or PNG images are allowed.")
-            image_data = await photo.read()
-            # Generate a unique filename or use a simpler one if GridFS handles IDs
-            filename = f"{uuid.uuid4()}-{photo.filename}"
-            file_id = await store_image_in_gridfs(image_data, filename, photo.content_type)
-            photo_ids.append(file_id)
+    photo_ids, photo_bytes = await _store_photos(photos)
 
     report_data = {
-        "type": "LOST",
+        "type": report_type,
         "subject": subject_type,
         "refs": ref_ids,
         "description_text": description_text,
@@ -73,7 +116,7 @@ async def create_lost_report(
             "description": location_description,
         },
         "status": "OPEN",
-        "created_at": datetime.utcnow(),
+        "created_at": datetime.now(timezone.utc),
         "posted_by_contact": current_user.contact # Add posted_by_contact
     }
     
@@ -93,16 +136,56 @@ async def create_lost_report(
     
     # Insert into MongoDB
     new_report = await database["reports"].insert_one(report_data)
-    created_report = await database["reports"].find_one({"_id": new_report.inserted_id})
+    # The inserted document is exactly report_data plus its new _id, so don't read it back
+    report_data["_id"] = new_report.inserted_id
+    created_report = report_data
     
     # Start matching process in the background
-    asyncio.create_task(run_matching_job(str(new_report.inserted_id), created_report, database))
+    await enqueue_matching_job(str(new_report.inserted_id), _matching_job_data(created_report, photo_bytes), database)
     
     # Generate photo URLs for the created report
     created_report["photo_urls"] = [f"/reports/images/{str(file_id)}" for file_id in photo_ids]
     
     return ReportSchema.model_validate(created_report)
 
+@router.post("/reports/lost", response_model=ReportSchema)
+async def create_lost_report(
+    subject_type: Literal["PERSON", "ITEM"] = Form(..., alias="subject"),
+    ref_ids_str: str = Form(..., alias="refs", description="Comma-separated IDs of person/item"),
+    description_text: str = Form(..., alias="desc_text"),
+    language: str = Form(..., alias="lang"),
+    latitude: float = Form(..., description="Latitude of the location"),
+    longitude: float = Form(..., description="Longitude of the location"),
+    location_description: Optional[str] = Form(None, alias="location_desc", description="Human-readable description of the location"),
+    photos: Optional[List[UploadFile]] = File(None), # Made photos optional
+    database: MongoClient = Depends(get_database), # Reverted to MongoDB client dependency
+    current_user: UserSchema = Depends(get_current_user), # Inject current user
+    # Person-specific details
+    is_child: Optional[bool] = Form(None, description="Indicates if the person is a child"),
+    height_cm: Optional[float] = Form(None, description="Height in centimeters"),
+    weight_kg: Optional[float] = Form(None, description="Weight in kilograms"),
+    identifying_features: Optional[str] = Form(None, description="Distinctive features"),
+    clothing_description: Optional[str] = Form(None, description="Description of clothing"),
+):
+    return await _create_report(
+        "LOST",
+        subject_type=subject_type,
+        ref_ids_str=ref_ids_str,
+        description_text=description_text,
+        language=language,
+        latitude=latitude,
+        longitude=longitude,
+        location_description=location_description,
+        photos=photos,
+        database=database,
+        current_user=current_user,
+        is_child=is_child,
+        height_cm=height_cm,
+        weight_kg=weight_kg,
+        identifying_features=identifying_features,
+        clothing_description=clothing_description,
+    )
+
 
 @router.post("/reports/found", response_model=ReportSchema)
 async def create_found_report(
@@ -123,69 +206,85 @@ async def create_found_report(
     identifying_features: Optional[str] = Form(None, description="Distinctive features"),
     clothing_description: Optional[str] = Form(None, description="Description of clothing"),
 ):
-    ref_ids = [rid.strip() for rid in ref_ids_str.split(',')]
+    return await _create_report(
+        "FOUND",
+        subject_type=subject_type,
+        ref_ids_str=ref_ids_str,
+        description_text=description_text,
+        language=language,
+        latitude=latitude,
+        longitude=longitude,
+        location_description=location_description,
+        photos=photos,
+        database=database,
+        current_user=current_user,
+        is_child=is_child,
+        height_cm=height_cm,
+        weight_kg=weight_kg,
+        identifying_features=identifying_features,
+        clothing_description=clothing_description,
+    )
 
-    # Store photos in GridFS
-    photo_ids = []
-    if photos:
-        for photo in photos:
-            if photo.content_type not in ["image/jpeg", "image/png"]:
-                raise HTTPException(status_code=400, detail="Only JPEG or PNG images are allowed.")
-            image_data = await photo.read()
-            filename = f"{uuid.uuid4()}-{photo.filename}"
-            file_id = await store_image_in_gridfs(image_data, filename, photo.content_type)
-            photo_ids.append(file_id)
 
-    report_data = {
-        "type": "FOUND",
-        "subject": subject_type,
-        "refs": ref_ids,
-        "description_text": description_text,
-        "language": language,
-        "photo_ids": photo_ids, # Use GridFS IDs
-        "location": {
-            "latitude": latitude,
-            "longitude": longitude,
-            "description": location_description,
-        },
-        "status": "OPEN",
-        "created_at": datetime.utcnow(),
-        "posted_by_contact": current_user.contact # Add posted_by_contact
-    }
-    
-    if subject_type == "PERSON":
-        report_data["person_details"] = PersonSchema(
-            name=None, # Name can be derived from ref_ids or handled separately if needed
-            age=None,  # Age can be derived or handled separately if needed
-            language=language, # Use report's language
-            photo_ids=photo_ids, # Use report's photo_ids
-            is_child=is_child,
-            height_cm=height_cm,
-            weight_kg=weight_kg,
-            identifying_features=identifying_features,
-            clothing_description=clothing_description,
-            guardian_contact=None # Can be added if passed directly to person_details
-        ).model_dump(exclude_unset=True) # Use model_dump to exclude unset fields
-    
-    # Insert into MongoDB
-    new_report = await database["reports"].insert_one(report_data)
-    created_report = await database["reports"].find_one({"_id": new_report.inserted_id})
+@router.post(
+    "/reports/bulk",
+    response_model=List[ReportSchema],
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": REPORT_CREATE_ITEM_SCHEMA}}},
+    }},
+)
+async def create_bulk_reports(
+    request: Request,
+    database: MongoClient = Depends(get_database),
+    current_user: UserSchema = Depends(get_current_user),
+):
+    """
+    Creates many photo-less reports with a single insert_many, e.g. for imports.
+    """
+    # Validate straight from the raw bytes in pydantic-core, skipping the intermediate json.loads
+    try:
+        reports_in = REPORT_CREATE_LIST_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+    if not reports_in:
+        return []
+    if len(reports_in) > MAX_BULK_REPORTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_REPORTS} reports can be created per request.")
 
-    # Start matching process in the background
-    asyncio.create_task(run_matching_job(str(new_report.inserted_id), created_report, database))
-    
-    # Generate photo URLs for the created report
-    created_report["photo_urls"] = [f"/reports/images/{str(file_id)}" for file_id in photo_ids]
-    
-    return ReportSchema.model_validate(created_report)
+    created_at = datetime.now(timezone.utc)
+    report_datas = [
+        {
+            "type": report_in.type,
+            "subject": report_in.subject_type,
+            "refs": report_in.ref_ids,
+            "description_text": report_in.description_text,
+            "language": report_in.language,
+            "photo_ids": [],
+            "location": report_in.location.model_dump(),
+            "status": "OPEN",
+            "created_at": created_at,
+            "posted_by_contact": current_user.contact,
+        }
+        for report_in in reports_in
+    ]
 
+    # insert_many sets _id on each document in place
+    await database["reports"].insert_many(report_datas, ordered=False)
+
+    for report_data in report_datas:
+        await enqueue_matching_job(str(report_data["_id"]), _matching_job_data(report_data, []), database)
+
+    return REPORT_LIST_ADAPTER.validate_python(report_datas) # One pydantic-core call for the whole batch
 
 @router.get("/reports/", response_model=List[ReportSchema])
 async def list_reports(
     type: Optional[str] = Query(None, description="Filter by report type (LOST or FOUND)"), # Changed Literal to str
     status: Optional[Literal["OPEN", "MATCHED", "REUNITED", "CLOSED"]] = Query(None, description="Filter by report status"),
-    skip: int = Query(0, description="Number of items to skip"),
-    limit: int = Query(10, description="Maximum number of items to return"),
+    skip: int = Query(0, ge=0, description="Number of items to skip"),
+    limit: int = Query(10, ge=1, le=200, description="Maximum number of items to return"),
+    before: Optional[str] = Query(None, description="Return reports older than this report ID (keyset pagination, preferred over skip)"),
     database: MongoClient = Depends(get_database), # Reverted to MongoDB client dependency
     current_user: UserSchema = Depends(get_current_user) # Ensure user is authenticated
 ):
@@ -194,23 +293,37 @@ async def list_reports(
         query["type"] = type.upper() # Ensure case-insensitive matching
     if status:
         query["status"] = status.upper() # Ensure case-insensitive matching
+    if before:
+        if not ObjectId.is_valid(before):
+            raise HTTPException(status_code=400, detail="Invalid report ID format")
+        query["_id"] = {"$lt": ObjectId(before)}
 
-    reports_cursor = database["reports"].find(query).sort("created_at", -1).skip(skip).limit(limit)
-    reports = await reports_cursor.to_list(length=limit)
-    
-    # For each report, convert photo_ids to base64 images for the client
-    # This is a placeholder for now, actual image serving would be a separate endpoint
-    for report in reports:
-        report["photo_urls"] = [f"/reports/images/{str(file_id)}" for file_id in report.get("photo_ids", [])]
+    # Build photo_urls inside mongod instead of looping over the page in Python
+    pipeline = [
+        {"$match": query},
+        # _id follows insertion order, so newest-first by _id matches created_at and supports keyset paging
+        {"$sort": {"_id": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": REPORT_PROJECTION},
+        {"$addFields": {"photo_urls": {"$map": {
+            "input": {"$ifNull": ["$photo_ids", []]},
+            "as": "file_id",
+            "in": {"$concat": ["/reports/images/", {"$toString": "$$file_id"}]},
+        }}}},
+    ]
+    reports = await database["reports"].aggregate(pipeline).to_list(length=limit)
 
-    return [ReportSchema.model_validate(report) for report in reports]
+    # Validate and serialize the whole page in pydantic-core, returning the bytes directly
+    # so FastAPI doesn't re-validate every row against response_model
+    return Response(
+        content=REPORT_LIST_ADAPTER.dump_json(REPORT_LIST_ADAPTER.validate_python(reports), by_alias=True),
+        media_type="application/json",
+    )
 
 @router.get("/reports/{report_id}", response_model=ReportSchema)
-async def get_report(report_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(report_id):
-        raise HTTPException(status_code=400, detail="Invalid report ID format")
-    
-    report = await database["reports"].find_one({"_id": ObjectId(report_id)})
+async def get_report(report_oid: ObjectId = Depends(valid_report_oid), database: MongoClient = Depends(get_database)):
+    report = await database["reports"].find_one({"_id": report_oid})
     if report is None:
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -220,24 +333,28 @@ async def get_report(report_id: str, database: MongoClient = Depends(get_databas
     return ReportSchema.model_validate(report)
 
 @router.delete("/reports/{report_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_report(report_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(report_id):
-        raise HTTPException(status_code=400, detail="Invalid report ID format")
-    
+async def delete_report(report_oid: ObjectId = Depends(valid_report_oid), database: MongoClient = Depends(get_database)):
     # Retrieve report to get photo_ids for GridFS deletion
-    report_to_delete = await database["reports"].find_one({"_id": ObjectId(report_id)})
+    report_to_delete = await database["reports"].find_one({"_id": report_oid})
     if not report_to_delete:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    # Delete associated images from GridFS
-    fs_bucket = get_gridfs_bucket()
-    for file_id_str in report_to_delete.get("photo_ids", []):
-        try:
-            await fs_bucket.delete(ObjectId(file_id_str))
-        except Exception as e:
-            print(f"Error deleting GridFS file {file_id_str}: {e}")
-
-    delete_result = await database["reports"].delete_one({"_id": ObjectId(report_id)})
+    # Delete the report and its images concurrently; removing the GridFS files and chunks with one
+    # delete_many each costs two round-trips however many photos there are. Image deletion stays best-effort.
+    orphaned_photo_oids = [ObjectId(file_id) for file_id in report_to_delete.get("photo_ids", [])]
+    delete_result, *photo_results = await asyncio.gather(
+        database["reports"].delete_one({"_id": report_oid}),
+        *((
+            database["fs.files"].delete_many({"_id": {"$in": orphaned_photo_oids}}),
+            database["fs.chunks"].delete_many({"files_id": {"$in": orphaned_photo_oids}}),
+        ) if orphaned_photo_oids else ()),
+        return_exceptions=True,
+    )
+    for result in photo_results:
+        if isinstance(result, Exception):
+            print(f"Error deleting GridFS files {orphaned_photo_oids}: {result}")
+    if isinstance(delete_result, Exception):
+        raise delete_result
     
     if delete_result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Report not found")
@@ -245,20 +362,25 @@ async def delete_report(report_id: str, database: MongoClient = Depends(get_data
     return {"message": "Report deleted successfully"}
 
 @router.get("/reports/images/{file_id}")
-async def get_report_image(file_id: str, database: MongoClient = Depends(get_database)):
-    if not ObjectId.is_valid(file_id):
-        raise HTTPException(status_code=400, detail="Invalid file ID format")
-
-    image_data = await get_image_from_gridfs(ObjectId(file_id))
-    if image_data is None:
+async def get_report_image(request: Request, file_oid: ObjectId = Depends(valid_file_oid), database: MongoClient = Depends(get_database)):
+    # One GridFS open gives both the chunk stream and the content type stored in metadata at upload.
+    # It also runs before the 304 check, so a deleted photo is never revalidated from a client cache
+    try:
+        grid_out = await get_gridfs_bucket().open_download_stream(file_oid)
+    except NoFile:
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    # Determine content type (you might store this in GridFS metadata when uploading)
-    # For now, let's assume it's a JPEG or PNG for simplicity.
-    # A more robust solution would store content_type in GridFS metadata.
-    # We'll fetch file metadata from GridFS to get the content type.
-    fs_bucket = GridFSBucket(database.client.get_database(database.name))
-    grid_out = await fs_bucket.open_download_stream(ObjectId(file_id))
-    content_type = grid_out.content_type if grid_out.content_type else "application/octet-stream"
-    
-    return Response(content=image_data, media_type=content_type)
+
+    # GridFS files are never modified in place, so the file ID is a stable validator
+    etag = f'"{file_oid}"'
+    cache_headers = {"ETag": etag, "Cache-Control": f"private, max-age={REPORT_IMAGE_MAX_AGE_SECONDS}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    metadata = grid_out.metadata or {}
+    content_type = metadata.get("contentType", "application/octet-stream")
+
+    async def stream_chunks():
+        # Memory stays bounded by the GridFS chunk size regardless of image size
+        while chunk := await grid_out.readchunk():
+            yield chunk
+
+    return StreamingResponse(stream_chunks(), media_type=content_type, headers=cache_headers)
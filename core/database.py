@@ -3,10 +3,12 @@
 import os
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import ServerSelectionTimeoutError, OperationFailure
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from typing import Optional, Any
 from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
 import io # Added import for io
 
 # Load environment variables
@@ -15,17 +17,40 @@ load_dotenv()
 MONGO_DB_URL = os.getenv("MONGO_DB_URL")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 
+# Connection pool tuning; keeping a warm minimum avoids connect latency on bursts after idle
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 200))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib") # Wire compression, negotiated with the server in order of preference
+
 client: Optional[AsyncIOMotorClient] = None
 database: Optional[Any] = None # Motor collection type
 fs: Optional[AsyncIOMotorGridFSBucket] = None
+users_contact_unique = False # Set once the unique index on users.contact exists; until then registration checks for duplicates itself
 
 async def startup_db_client():
     global client, database, fs
     try:
-        client = AsyncIOMotorClient(MONGO_DB_URL, serverSelectionTimeoutMS=5000)
+        client = AsyncIOMotorClient(
+            MONGO_DB_URL,
+            serverSelectionTimeoutMS=5000,
+            tz_aware=True, # Read datetimes back as UTC-aware, matching what handlers write
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            retryWrites=True,
+            compressors=MONGO_COMPRESSORS,
+        )
         await client.admin.command('ping')
         database = client[MONGO_DB_NAME]
         fs = AsyncIOMotorGridFSBucket(database)
+        await ensure_indexes(database)
         print("Connected to MongoDB!")
     except ServerSelectionTimeoutError as err:
         print(f"MongoDB connection error: {err}")
@@ -35,6 +60,29 @@ async def startup_db_client():
         # Optionally, raise the exception or exit if DB is critical for startup
         raise
 
+async def ensure_indexes(db):
+    """
+    Creates the indexes the hot query paths rely on. Safe to call on every startup.
+    A unique index that existing documents violate is logged and skipped instead of failing startup.
+    """
+    global users_contact_unique
+    try:
+        await db["users"].create_index("contact", unique=True)
+        users_contact_unique = True
+    except OperationFailure as err:
+        users_contact_unique = False
+        print(f"Could not create unique index on users.contact; deduplicate existing contacts to enable it: {err}")
+    try:
+        await db["users"].create_index(
+            "hashed_refresh_token",
+            unique=True,
+            partialFilterExpression={"hashed_refresh_token": {"$type": "string"}},
+        )
+    except OperationFailure as err:
+        print(f"Could not create unique index on users.hashed_refresh_token: {err}")
+    await db["matches"].create_index([("status", 1), ("_id", -1)])
+    await db["reports"].create_index([("type", 1), ("status", 1), ("_id", -1)])
+
 async def shutdown_db_client():
     global client
     if client:
@@ -46,6 +94,28 @@ def get_database():
         raise Exception("Database client not initialized. Call startup_db_client() first.")
     return database
 
+# Path parameter dependencies: parse an ID once, rejecting malformed IDs with the same 400 in every router
+def valid_report_oid(report_id: str) -> ObjectId:
+    """Parses the report_id path parameter once, rejecting malformed IDs with a 400."""
+    try:
+        return ObjectId(report_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid report ID format")
+
+def valid_match_oid(match_id: str) -> ObjectId:
+    """Parses the match_id path parameter once, rejecting malformed IDs with a 400."""
+    try:
+        return ObjectId(match_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid match ID format")
+
+def valid_file_oid(file_id: str) -> ObjectId:
+    """Parses the file_id path parameter once, rejecting malformed IDs with a 400."""
+    try:
+        return ObjectId(file_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid file ID format")
+
 def get_gridfs_bucket():
     if fs is None:
         raise Exception("GridFS bucket not initialized. Call startup_db_client() first.")
@@ -1,10 +1,15 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 import os
+import hmac
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-from jose import JWTError, jwt # Re-added jose imports for JWT
+import jwt # PyJWT
+from jwt import PyJWTError
 from passlib.context import CryptContext
+from cachetools import TTLCache
 
 from models.schemas import UserSchema # Import UserSchema for token validation
 from fastapi import Depends, HTTPException, status
@@ -19,17 +24,45 @@ SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key") # Re-added SECRET_KEY
 ALGORITHM = os.getenv("ALGORITHM", "HS256") # Re-added ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)) # Re-added ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 7 * 24 * 60)) # 7 days
+REFRESH_TOKEN_PEPPER = os.getenv("REFRESH_TOKEN_PEPPER", SECRET_KEY).encode() # Server-side secret for refresh token HMACs
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Argon2id for new hashes; bcrypt kept so existing password hashes still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=64 * 1024,
+    argon2__parallelism=1,
+)
+
+# Password hashing gets its own bounded pool, so long jobs on the default executor (FAISS rebuilds,
+# index saves) can't starve logins, and a burst of logins can't exhaust memory at 64 MiB per Argon2 hash
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token") # Re-added OAuth2 scheme
 
+# Short-lived cache of (user, token exp) for validated access tokens, keyed by a digest of the token
+CURRENT_USER_CACHE_TTL_SECONDS = int(os.getenv("CURRENT_USER_CACHE_TTL_SECONDS", 30))
+current_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=CURRENT_USER_CACHE_TTL_SECONDS)
+# Only fetch the fields UserSchema reads, never the password hash
+USER_PROJECTION = {(field.alias or name): 1 for name, field in UserSchema.model_fields.items()}
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verifies a password and returns a replacement hash if the stored one uses a deprecated scheme."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def hash_refresh_token(token: str) -> str:
+    """Returns a peppered HMAC-SHA256 of a refresh token for storage."""
+    return hmac.new(REFRESH_TOKEN_PEPPER, token.encode(), hashlib.sha256).hexdigest()
+
 # Re-added JWT functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -52,17 +85,21 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def decode_access_token(token: str):
+    # Verified locally against SECRET_KEY; no round-trip to an auth service
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(
+            token, SECRET_KEY, algorithms=[ALGORITHM],
+            options={"require": ["exp", "sub"]}
+        )
         return payload
-    except JWTError:
+    except PyJWTError:
         return None
 
 def decode_refresh_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
-    except JWTError:
+    except PyJWTError:
         return None
 
 async def get_current_user(token: str = Depends(oauth2_scheme), database: MongoClient = Depends(get_database)) -> UserSchema:
@@ -71,6 +108,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), database: MongoC
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = current_user_cache.get(cache_key)
+    if cached is not None:
+        cached_user, expires_at = cached
+        # Serve from cache only while the token is still valid for at least another second
+        if expires_at - datetime.now(timezone.utc).timestamp() >= 1:
+            return cached_user
+        current_user_cache.pop(cache_key, None)
+
     payload = decode_access_token(token)
     if payload is None:
         raise credentials_exception
@@ -80,8 +126,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme), database: MongoC
         raise credentials_exception
     
     # Retrieve user from MongoDB based on contact
-    user_data = await database["users"].find_one({"contact": contact})
+    user_data = await database["users"].find_one({"contact": contact}, projection=USER_PROJECTION)
     if user_data is None:
         raise credentials_exception
     
-    return UserSchema.model_validate(user_data)
+    user = UserSchema.model_validate(user_data)
+    current_user_cache[cache_key] = (user, payload["exp"])
+    return user
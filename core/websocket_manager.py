@@ -1,21 +1,22 @@
-from typing import List, Dict
+from typing import Dict, Set
 import asyncio
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[any]] = {}
+        self.active_connections: Dict[str, Set[any]] = {} # Sets give O(1) add/remove per connection
 
     async def connect(self, websocket: any, user_id: str):
         await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections.setdefault(user_id, set()).add(websocket)
 
     def disconnect(self, websocket: any, user_id: str):
-        self.active_connections[user_id].remove(websocket)
-        if not self.active_connections[user_id]:
+        connections = self.active_connections.get(user_id)
+        if connections is None:
+            return
+        connections.discard(websocket)
+        if not connections:
             del self.active_connections[user_id]
 
     async def send_personal_message(self, message: str, websocket: any):
@@ -25,15 +26,21 @@ class ConnectionManager:
             print(f"WebSocket connection closed for personal message: {e}")
 
     async def broadcast(self, message: str):
-        for user_id in list(self.active_connections.keys()):
-            for connection in list(self.active_connections[user_id]):
-                try:
-                    await connection.send_text(message)
-                except (ConnectionClosedOK, ConnectionClosedError) as e:
-                    print(f"WebSocket connection closed during broadcast: {e}")
-                    self.active_connections[user_id].remove(connection)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
+        # Fan out to every connection concurrently instead of awaiting each send in turn
+        targets = [
+            (user_id, connection)
+            for user_id, connections in self.active_connections.items()
+            for connection in connections
+        ]
+        if not targets:
+            return
+        results = await asyncio.gather(
+            *(connection.send_text(message) for _, connection in targets),
+            return_exceptions=True,
+        )
+        for (user_id, connection), result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"WebSocket connection closed during broadcast: {result}")
+                self.disconnect(connection, user_id)
 
 manager = ConnectionManager()
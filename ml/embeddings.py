@@ -1,10 +1,37 @@
 import numpy as np
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache
 from typing import List, Optional, Union
 from PIL import Image
 from io import BytesIO
-import base64
+
+# libjpeg-turbo (SIMD) for JPEG decoding when available; PNGs and other formats go through Pillow
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    print("PyTurboJPEG or libjpeg-turbo not available. Falling back to Pillow for JPEG decoding.")
+    turbo_jpeg = None
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+# Decodes a report's photos concurrently; created lazily by the executor, so idle processes start no threads
+image_decode_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="image-decode")
+
+# Re-reported photos embed identically, so face and CLIP embeddings are cached by a digest of the photo bytes
+IMAGE_EMBEDDING_CACHE_SIZE = int(os.getenv("IMAGE_EMBEDDING_CACHE_SIZE", 4096))
+face_embedding_cache: LRUCache = LRUCache(maxsize=IMAGE_EMBEDDING_CACHE_SIZE) # digest -> faces' embeddings in one photo
+image_embedding_cache: LRUCache = LRUCache(maxsize=IMAGE_EMBEDDING_CACHE_SIZE)
+image_embedding_cache_lock = threading.Lock()
+
+def _content_key(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
 
 # For Face Embeddings
+FACE_EMBEDDING_DIM = 512 # ArcFace
 try:
     # from deepface import DeepFace # Commented out due to temporary ML library disable
     # DeepFace models: 'VGG-Face', 'Facenet', 'Facenet512', 'OpenFace', 'DeepFace', 'DeepID', 'ArcFace', 'Dlib', 'SFace'
@@ -14,6 +41,7 @@ except ImportError:
     DeepFace = None
 
 # For Image Embeddings (CLIP)
+CLIP_EMBEDDING_DIM = 512 # ViT-B/32
 try:
     # from transformers import CLIPProcessor, CLIPModel # Commented out due to temporary ML library disable
     # import torch # Commented out due to temporary ML library disable
@@ -28,6 +56,11 @@ except ImportError:
     clip_processor = None
 
 # For Text Embeddings (Sentence-Transformers)
+SBERT_BATCH_SIZE = 32 # Texts per forward pass when encoding a batch
+# Identical descriptions ("black iPhone") embed identically, so cache embeddings by a digest of the text.
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", 10_000))
+text_embedding_cache: LRUCache = LRUCache(maxsize=TEXT_EMBEDDING_CACHE_SIZE)
+text_embedding_cache_lock = threading.Lock() # Embeddings may be computed from several executor threads
 try:
     from sentence_transformers import SentenceTransformer # Uncommented for multilingual text embeddings
     SBERT_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
@@ -36,70 +69,127 @@ except ImportError:
     print("Sentence-Transformers not installed. Text embeddings will be unavailable.")
     sbert_model = None
 
-def get_face_embeddings(image_base64_list: List[str]) -> List[List[float]]:
+def _decode_image(img_bytes: bytes) -> Optional[np.ndarray]:
+    """Decodes raw encoded (JPEG/PNG) bytes into an RGB array, or None if the image can't be read."""
+    try:
+        if turbo_jpeg is not None and img_bytes[:3] == JPEG_MAGIC:
+            return turbo_jpeg.decode(img_bytes, pixel_format=TJPF_RGB)
+        return np.array(Image.open(BytesIO(img_bytes)).convert("RGB"))
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        return None
+
+def get_face_embeddings(images: List[bytes]) -> np.ndarray:
     """
     Generates face embeddings for all detected faces in a list of images.
-    Each image is provided as a base64 encoded string.
+    Each image is provided as raw encoded (JPEG/PNG) bytes.
+    Returns an (n_faces, FACE_EMBEDDING_DIM) float32 array, empty when no faces are found.
     """
     if DeepFace is None:
-        return []
+        return np.empty((0, FACE_EMBEDDING_DIM), dtype=np.float32)
+
+    cache_keys = [_content_key(img_bytes) for img_bytes in images]
+    with image_embedding_cache_lock:
+        cached = [face_embedding_cache.get(key) for key in cache_keys]
+    uncached_images = [img_bytes for img_bytes, embeddings in zip(images, cached) if embeddings is None]
+
+    # Pillow releases the GIL while decoding, so decode all photos in parallel up front
+    decoded_images = iter(
+        image_decode_executor.map(_decode_image, uncached_images) if len(uncached_images) > 1 else map(_decode_image, uncached_images)
+    )
 
     face_embeddings = []
-    for img_b64 in image_base64_list:
+    for cache_key, photo_embeddings in zip(cache_keys, cached):
+        if photo_embeddings is not None:
+            face_embeddings.extend(photo_embeddings)
+            continue
+        img_np = next(decoded_images)
+        if img_np is None:
+            continue
         try:
-            # Decode base64 to image
-            img_bytes = base64.b64decode(img_b64)
-            img_stream = BytesIO(img_bytes)
-            img_np = np.array(Image.open(img_stream))
-
             # Extract face embeddings. DeepFace can return multiple faces per image.
             # We will take the embedding for each detected face.
             # This is a simplified approach; in a real scenario, you might want to
             # select the main face or handle multiple faces more explicitly.
             # representations = DeepFace.represent(img_path=img_np, model_name=FACE_MODEL_NAME, enforce_detection=False) # DeepFace is commented out
             representations = [] # Placeholder since DeepFace is commented out
-            if representations:
-                for rep in representations:
-                    face_embeddings.append(rep["embedding"])
+            photo_embeddings = [rep["embedding"] for rep in representations]
+            face_embeddings.extend(photo_embeddings)
+            with image_embedding_cache_lock:
+                face_embedding_cache[cache_key] = photo_embeddings
         except Exception as e:
             print(f"Error processing face for an image: {e}")
             continue
-    return face_embeddings
+    return np.asarray(face_embeddings, dtype=np.float32).reshape(-1, FACE_EMBEDDING_DIM)
 
-def get_image_embedding(image_base64: str) -> Optional[List[float]]:
+def get_image_embedding(image_bytes: bytes) -> Optional[np.ndarray]:
     """
     Generates a single CLIP image embedding for an item image.
-    The image is provided as a base64 encoded string.
+    The image is provided as raw encoded (JPEG/PNG) bytes.
+    Returns a (1, CLIP_EMBEDDING_DIM) float32 array.
     """
     if clip_model is None or clip_processor is None:
         return None
+    cache_key = _content_key(image_bytes)
+    with image_embedding_cache_lock:
+        cached = image_embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
-        img_bytes = base64.b64decode(image_base64)
-        img_stream = BytesIO(img_bytes)
-        image = Image.open(img_stream)
+        image = _decode_image(image_bytes)
+        if image is None:
+            return None
 
         # inputs = clip_processor(images=image, return_tensors="pt").to(CLIP_DEVICE) # CLIP is commented out
         # with torch.no_grad(): # Torch is commented out
         #     image_features = clip_model.get_image_features(**inputs) # CLIP is commented out
-        # return image_features.squeeze().cpu().numpy().tolist() # CLIP is commented out
-        return [0.0] * 512 # Placeholder for CLIP embedding
+        # image_embedding = image_features.cpu().numpy().astype(np.float32) # CLIP is commented out
+        image_embedding = np.zeros((1, CLIP_EMBEDDING_DIM), dtype=np.float32) # Placeholder for CLIP embedding
+        with image_embedding_cache_lock:
+            image_embedding_cache[cache_key] = image_embedding
+        return image_embedding
     except Exception as e:
         print(f"Error processing image for CLIP embedding: {e}")
         return None
 
-def get_text_embedding(text: str, language: str = "en") -> Optional[List[float]]:
+def get_text_embeddings(texts: List[str], language: str = "en") -> Optional[np.ndarray]:
     """
-    Generates a multilingual text embedding for a description.
+    Generates multilingual text embeddings for a batch of descriptions in one encode call.
+    Returns a (len(texts), dim) float32 array of unit-length vectors.
     """
     if sbert_model is None:
         return None
-    try:
-        # Sentence-transformers are already multilingual with this model
-        embeddings = sbert_model.encode(text) # SBERT is uncommented
-        return embeddings.tolist() # SBERT is uncommented
-    except Exception as e:
-        print(f"Error processing text for SBERT embedding: {e}")
+    cache_keys = [_content_key(text.encode()) for text in texts]
+    with text_embedding_cache_lock:
+        cached = [text_embedding_cache.get(key) for key in cache_keys]
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    if missing:
+        try:
+            # Sentence-transformers are already multilingual with this model; batching sorts texts by length to minimize padding
+            encoded = sbert_model.encode(
+                [texts[i] for i in missing],
+                batch_size=SBERT_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            ).astype(np.float32, copy=False)
+        except Exception as e:
+            print(f"Error processing text for SBERT embedding: {e}")
+            return None
+        with text_embedding_cache_lock:
+            for i, embedding in zip(missing, encoded):
+                text_embedding_cache[cache_keys[i]] = embedding
+                cached[i] = embedding
+    return np.stack(cached)
+
+def get_text_embedding(text: str, language: str = "en") -> Optional[List[float]]:
+    """
+    Generates a multilingual text embedding for a description.
+    """
+    embeddings = get_text_embeddings([text], language)
+    if embeddings is None:
         return None
+    return embeddings[0].tolist()
 
 def calculate_fused_score(face_score: float, img_score: float, text_score: float) -> float:
     """
@@ -3,16 +3,18 @@
 import faiss
 import numpy as np
 import math # Import math for geographical calculations
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import os
-from sklearn.metrics.pairwise import cosine_similarity
-import uuid
-from datetime import datetime
+import json
+import hashlib
+import asyncio
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from bson import ObjectId # Import ObjectId for MongoDB
 
-from models.schemas import ReportSchema, MatchSchema, ItemSchema
-from core.database import get_database # Added MongoDB database import
-from ml.embeddings import get_face_embeddings, get_image_embedding, get_text_embedding, calculate_fused_score
+from ml.embeddings import get_face_embeddings, get_image_embedding, get_text_embeddings
 # from ml.speech_to_text import transcribe_audio # Removed due to temporary disable
 from core.websocket_manager import manager
 
@@ -22,12 +24,73 @@ os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
 
 # Placeholder for loaded FAISS indexes
 # In a real application, these would be loaded once at startup or managed more robustly.
+# Each modality has one index per report type (e.g. "face_LOST"), so a report only ever searches the opposite type's index
 faiss_indexes: Dict[str, any] = {}
+faiss_report_ids: Dict[str, Dict[int, str]] = {} # index name -> FAISS int64 ID -> report ID
+REPORT_TYPES = ("LOST", "FOUND")
+
+# Embedding dimension per modality
+FAISS_INDEX_DIMENSIONS = {
+    "face": 512, # DeepFace ArcFace: 512
+    "image": 512, # CLIP: 512
+    "text": 384, # SBERT: 384
+}
+
+# Indexes start as an exhaustive FAISS_INITIAL_INDEX; the default SQfp16 stores vectors as float16, halving
+# memory and file size versus IndexFlatIP with no training and negligible effect on cosine scores.
+# Once an index grows large enough it is rebuilt as its modality's entry in FAISS_INDEX_FACTORIES:
+# faces go to FAISS_INDEX_FACTORY (IVF+PQ by default, which scans ~nprobe/nlist of the data per query)
+# after FAISS_TRAIN_MIN_VECTORS vectors; image and text go to an HNSW graph over 8-bit scalar-quantized
+# vectors (a quarter of float32's bytes per vector, trained on the vectors being rebuilt) after FAISS_HNSW_MIN_VECTORS vectors
+FAISS_INITIAL_INDEX = os.getenv("FAISS_INITIAL_INDEX", "SQfp16")
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "IVF1024,PQ32x8")
+FAISS_HNSW_INDEX_FACTORY = os.getenv("FAISS_HNSW_INDEX_FACTORY", "HNSW32,SQ8")
+FAISS_INDEX_FACTORIES = {
+    "face": FAISS_INDEX_FACTORY,
+    "image": FAISS_HNSW_INDEX_FACTORY,
+    "text": FAISS_HNSW_INDEX_FACTORY,
+}
+FAISS_TRAIN_MIN_VECTORS = int(os.getenv("FAISS_TRAIN_MIN_VECTORS", 40 * 1024)) # ~40 training points per IVF list
+FAISS_HNSW_MIN_VECTORS = int(os.getenv("FAISS_HNSW_MIN_VECTORS", 10_000))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", 40))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", 64))
+
+# Indexes are rewritten to disk in batches rather than on every report: after FAISS_FLUSH_EVERY additions,
+# every FAISS_FLUSH_INTERVAL_SECONDS if anything changed, and once more on shutdown
+FAISS_FLUSH_EVERY = int(os.getenv("FAISS_FLUSH_EVERY", 64))
+FAISS_FLUSH_INTERVAL_SECONDS = float(os.getenv("FAISS_FLUSH_INTERVAL_SECONDS", 30))
+faiss_unsaved_additions: Dict[str, int] = {} # modality -> vectors added since the last save
+# FAISS isn't safe to add to while another thread searches the same index, so each index has its own lock:
+# a job adding to face_LOST never waits on another job searching text_FOUND
+faiss_index_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+# Background matching queue, drained by worker tasks started with the app
+MATCHING_WORKERS = int(os.getenv("MATCHING_WORKERS", 1))
+matching_queue: Optional[asyncio.Queue] = None
+matching_worker_tasks: List[asyncio.Task] = []
+
+# Embedding extraction runs in separate processes when EMBEDDING_PROCESSES > 0, otherwise in the default thread pool
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", 0))
+embedding_executor: Optional[ProcessPoolExecutor] = None
+
+# Descriptions from concurrent jobs are embedded together: the batcher waits up to TEXT_BATCH_WINDOW_SECONDS
+# after the first pending text for more, then sends up to TEXT_BATCH_MAX_SIZE texts through one encode call
+TEXT_BATCH_MAX_SIZE = int(os.getenv("TEXT_BATCH_MAX_SIZE", 16))
+TEXT_BATCH_WINDOW_SECONDS = float(os.getenv("TEXT_BATCH_WINDOW_SECONDS", 0.005))
+text_embedding_queue: Optional[asyncio.Queue] = None
 
 # Thresholds (will be tuned later as per the plan)
 PERSON_MATCH_THRESHOLD = 0.70 # Example threshold for persons
 ITEM_MATCH_THRESHOLD = 0.60 # Example threshold for items
 
+# Fused score weights; total weights should sum to 1.0 so the fused score stays comparable to the thresholds.
+# Distance gets a small weight initially.
+FUSED_WEIGHTS = {"face": 0.5, "image": 0.3, "text": 0.1, "distance": 0.1}
+FUSED_MODALITIES = ("face", "image", "text") # Columns of the candidate score matrix, followed by distance
+FUSED_WEIGHT_VECTOR = np.array([FUSED_WEIGHTS[name] for name in FUSED_MODALITIES + ("distance",)], dtype=np.float32)
+MAX_DISTANCE_FOR_SCORE = 5.0 # km - reports further than this get 0 distance score
+
 # Constants for Haversine formula
 R_EARTH_KM = 6371.0 # Radius of Earth in kilometers
 
@@ -50,81 +113,281 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     distance = R_EARTH_KM * c
     return distance
 
+def haversine_np(lat1: float, lon1: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized haversine_distance from one point to arrays of points, in kilometers.
+    NaN coordinates give a NaN distance.
+    """
+    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
+    lats_rad, lons_rad = np.radians(lats), np.radians(lons)
+
+    dlon = lons_rad - lon1_rad
+    dlat = lats_rad - lat1_rad
+
+    a = np.sin(dlat / 2)**2 + math.cos(lat1_rad) * np.cos(lats_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R_EARTH_KM * c
+
+def faiss_index_name(modality: str, report_type: str) -> str:
+    """Name of the index holding `report_type` reports' embeddings for a modality; also its file name prefix."""
+    return f"{modality}_{report_type}"
+
 def initialize_faiss_index(dimension: int, index_type: str = "Flat") -> faiss.Index:
     """
     Initializes a FAISS index.
-    'Flat' is simple brute force, good for starting. For larger datasets, explore 'IVF'.
+    'Flat' is simple brute force, good for starting. Any other value is treated as a faiss.index_factory
+    string (e.g. 'IVF1024,PQ32x8' or 'HNSW32,Flat') over inner product; IVF indexes must be trained before use.
     """
     if index_type == "Flat":
-        return faiss.IndexFlatIP(dimension) # IP for inner product (cosine similarity is related)
-    else:
-        raise ValueError(f"Unsupported FAISS index type: {index_type}")
+        return faiss.IndexFlatIP(dimension) # IP over unit-normalized vectors is cosine similarity
+    index = faiss.index_factory(dimension, index_type, faiss.METRIC_INNER_PRODUCT) # Already the concrete subclass; a downcast_index() view would not own the index and leave it dangling
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION # Must be set before any vectors are added
+    return index
+
+def create_faiss_index(dimension: int) -> faiss.IndexIDMap2:
+    """Creates an empty FAISS_INITIAL_INDEX wrapped in an IndexIDMap2, so FAISS stores and persists each vector's ID."""
+    return faiss.IndexIDMap2(initialize_faiss_index(dimension, FAISS_INITIAL_INDEX))
+
+def faiss_id_for_report(report_id: str) -> int:
+    """Stable 63-bit FAISS ID for a report ID (FAISS IDs are int64 and -1 means 'no result')."""
+    return int.from_bytes(hashlib.blake2b(report_id.encode(), digest_size=8).digest(), "big") & 0x7FFFFFFFFFFFFFFF
+
+def configure_faiss_index(index: faiss.Index) -> faiss.Index:
+    """Applies search-time parameters (nprobe for IVF, efSearch for HNSW indexes); a no-op for flat indexes."""
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        ivf_index.nprobe = FAISS_NPROBE
+    inner_index = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner_index, faiss.IndexHNSW):
+        inner_index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    return index
+
+def faiss_rebuild_index_type(index_name: str) -> Optional[str]:
+    """
+    The index type an exhaustive index should be rebuilt as once it has grown past its threshold,
+    or None while it is still small enough to brute-force.
+    """
+    index = faiss_indexes[index_name]
+    if not isinstance(faiss.downcast_index(index.index), (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+        return None # Already rebuilt
+    index_type = FAISS_INDEX_FACTORIES.get(index_name.rsplit("_", 1)[0], FAISS_INDEX_FACTORY)
+    if index_type == FAISS_INITIAL_INDEX:
+        return None
+    min_vectors = FAISS_TRAIN_MIN_VECTORS if "IVF" in index_type else FAISS_HNSW_MIN_VECTORS
+    return index_type if index.ntotal >= min_vectors else None
+
+def train_faiss_index(index: faiss.IndexIDMap2, index_type: str = FAISS_INDEX_FACTORY) -> faiss.IndexIDMap2:
+    """
+    Rebuilds a populated exhaustive (flat or scalar-quantized) index as an `index_type` index,
+    training it first if that type needs it, and carries every vector's ID over.
+    """
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    ids = faiss.vector_to_array(index.id_map)
+    trained_index = initialize_faiss_index(index.d, index_type)
+    if not trained_index.is_trained:
+        trained_index.train(vectors)
+    trained_index = faiss.IndexIDMap2(trained_index)
+    trained_index.add_with_ids(vectors, ids)
+    return configure_faiss_index(trained_index)
 
 def load_or_create_faiss_index(modality: str, dimension: int) -> faiss.Index:
     """
-    Loads an existing FAISS index or creates a new one if it doesn't exist.
+    Loads an existing FAISS index (and its report ID sidecar) or creates a new one if it doesn't exist.
+    A bare index with no sidecar, as older versions wrote, can't be mapped back to reports and is replaced.
     """
     index_path = os.path.join(FAISS_INDEX_DIR, f"{modality}_index.faiss")
-    if os.path.exists(index_path):
+    id_map_path = os.path.join(FAISS_INDEX_DIR, f"{modality}_ids.json")
+    index = None
+    if os.path.exists(index_path) and os.path.exists(id_map_path):
         print(f"Loading existing FAISS index for {modality} from {index_path}")
-        return faiss.read_index(index_path)
-    else:
+        index = faiss.read_index(index_path)
+        with open(id_map_path) as f:
+            report_ids = json.load(f)
+    elif os.path.exists(index_path):
+        print(f"FAISS index for {modality} has no report ID map, recreating it")
+    if index is None:
         print(f"Creating new FAISS index for {modality} with dimension {dimension}")
-        new_index = initialize_faiss_index(dimension)
-        faiss_indexes[modality] = new_index # Store reference to the newly created index
-        return new_index
+        index = create_faiss_index(dimension)
+        report_ids = []
+    faiss_report_ids[modality] = {faiss_id_for_report(rid): rid for rid in report_ids}
+    faiss_indexes[modality] = configure_faiss_index(index) # Store reference to the loaded/created index
+    return index
 
 def update_faiss_index(modality: str, new_embeddings: np.ndarray, report_ids: List[str]):
     """
     Adds new embeddings and their corresponding report IDs to the FAISS index.
     Assumes `faiss_indexes` is globally accessible or passed around.
-    Note: FAISS IndexFlatIP does not store IDs directly. We need a mapping.
-    For this prototype, we'll keep a simple in-memory mapping.
-    In production, this mapping would be persistent (e.g., in MongoDB).
+    FAISS stores an int64 ID per vector; the reverse mapping to report IDs is kept in
+    `faiss_report_ids` and persisted next to the index as a JSON sidecar.
+    Blocking (it may retrain the whole index): call it via asyncio.to_thread while holding the index's lock.
     """
     index = faiss_indexes.get(modality)
     if index is None:
         # Determine dimension from embeddings, or set a default/expected dimension
-        dimension = new_embeddings.shape[1] if new_embeddings.size > 0 else 512 # Default to 512 if no embeddings to infer
+        dimension = new_embeddings.shape[1] if new_embeddings.size > 0 else FAISS_INDEX_DIMENSIONS.get(modality, 512)
         index = load_or_create_faiss_index(modality, dimension)
-        faiss_indexes[modality] = index # Ensure the global/module-level reference is updated
-
-    # FAISS requires float32
-    new_embeddings = new_embeddings.astype('float32')
 
-    # Add vectors to the index
-    index.add(new_embeddings)
-
-    # For now, we'll simulate an ID mapping. In a real system, this would be persisted.
-    if not hasattr(index, 'id_map'):
-        index.id_map = [] # Initialize if not present
-    index.id_map.extend(report_ids)
-
-    # Save the updated index
+    # FAISS requires C-contiguous float32, otherwise the SWIG wrapper makes a hidden copy of its own.
+    # Copy once here so normalizing in place never touches the caller's array, then unit-normalize
+    # once on write so inner product is cosine similarity
+    new_embeddings = np.array(new_embeddings, dtype=np.float32, order="C")
+    faiss.normalize_L2(new_embeddings)
+
+    # Add vectors to the index under their reports' FAISS IDs
+    ids = np.array([faiss_id_for_report(rid) for rid in report_ids], dtype=np.int64)
+    index.add_with_ids(new_embeddings, ids)
+    faiss_report_ids[modality].update(zip(ids.tolist(), report_ids))
+
+    # Brute force is fine while the index is small; past its threshold switch to the approximate index
+    rebuild_index_type = faiss_rebuild_index_type(modality)
+    if rebuild_index_type is not None:
+        print(f"Rebuilding FAISS index for {modality} as {rebuild_index_type} on {index.ntotal} vectors")
+        index = train_faiss_index(index, rebuild_index_type)
+        faiss_indexes[modality] = index # Swapped in only once fully trained and populated
+
+    faiss_unsaved_additions[modality] = faiss_unsaved_additions.get(modality, 0) + len(new_embeddings)
+    print(f"Updated FAISS index for {modality} with {len(new_embeddings)} new embeddings. Total vectors: {index.ntotal}")
+    if faiss_unsaved_additions[modality] >= FAISS_FLUSH_EVERY:
+        save_faiss_index(modality)
+
+def save_faiss_index(modality: str):
+    """
+    Writes a modality's index and its ID map to disk. Each file is written to a temporary path
+    and renamed into place, so a crash mid-write never leaves a truncated index behind.
+    """
+    index = faiss_indexes[modality]
     index_path = os.path.join(FAISS_INDEX_DIR, f"{modality}_index.faiss")
-    faiss.write_index(index, index_path)
-    print(f"Updated and saved FAISS index for {modality} with {len(new_embeddings)} new embeddings. Total vectors: {index.ntotal}")
-
-def search_faiss_index(modality: str, query_embedding: np.ndarray, k: int = 5) -> (np.ndarray, List[str]):
+    id_map_path = os.path.join(FAISS_INDEX_DIR, f"{modality}_ids.json")
+    faiss.write_index(index, index_path + ".tmp")
+    with open(id_map_path + ".tmp", "w") as f:
+        json.dump(list(faiss_report_ids[modality].values()), f)
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(id_map_path + ".tmp", id_map_path)
+    faiss_unsaved_additions[modality] = 0
+    print(f"Saved FAISS index for {modality}. Total vectors: {index.ntotal}")
+
+async def flush_faiss_indexes():
+    """
+    Saves every index with additions that haven't been written to disk yet. Each write runs in a worker
+    thread under the index's lock, so it never blocks the event loop or serializes a half-updated index.
+    """
+    for modality, unsaved in list(faiss_unsaved_additions.items()):
+        if unsaved:
+            async with faiss_index_locks[modality]:
+                await asyncio.to_thread(save_faiss_index, modality)
+
+async def _faiss_flush_loop():
+    while True:
+        await asyncio.sleep(FAISS_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_faiss_indexes()
+        except Exception as e:
+            print(f"Failed to save FAISS indexes: {e}")
+
+def search_faiss_index(modality: str, query_embeddings: np.ndarray, k: int = 5) -> Tuple[np.ndarray, List[List[str]]]:
     """
-    Searches a FAISS index for the nearest neighbors.
-    Returns scores and corresponding report IDs.
+    Searches a FAISS index for the nearest neighbors of a batch of queries, shape (nq, d) or (d,).
+    All queries go through a single index.search call so FAISS can parallelize across them.
+    Returns the (nq, k) scores and, per query, the report IDs of its hits.
     """
     index = faiss_indexes.get(modality)
     if index is None:
         raise ValueError(f"FAISS index for modality '{modality}' not found.")
 
-    # FAISS requires float32
-    query_embedding = query_embedding.astype('float32')
+    # FAISS requires 2-D C-contiguous float32; queries are unit-normalized like the stored vectors
+    query_embeddings = np.array(np.atleast_2d(query_embeddings), dtype=np.float32, order="C")
+    faiss.normalize_L2(query_embeddings)
 
     # Search for k nearest neighbors
-    distances, indices = index.search(query_embedding, k)
+    distances, indices = index.search(query_embeddings, k)
 
-    # Get report IDs from the index's ID map
-    report_ids = [index.id_map[i] for i in indices[0]]
+    # Map FAISS IDs back to report IDs; FAISS pads each row with -1 when it has fewer than k hits
+    id_lookup = faiss_report_ids[modality]
+    report_ids = [[id_lookup[i] for i in row.tolist() if i >= 0] for row in indices]
 
     return distances, report_ids
 
+def as_embedding_matrix(modality: str, embeddings) -> np.ndarray:
+    """Stacks a modality's embeddings into an (n, d) float32 array, (0, d) when there are none."""
+    dimension = FAISS_INDEX_DIMENSIONS[modality]
+    if len(embeddings) == 0:
+        return np.empty((0, dimension), dtype=np.float32)
+    return np.asarray(embeddings, dtype=np.float32).reshape(-1, dimension)
+
+async def locked_update_faiss_index(index_name: str, new_embeddings: np.ndarray, report_ids: List[str]):
+    """
+    Runs update_faiss_index in a worker thread while holding the index's lock. Its adds and any rebuild
+    (IVF training or building the HNSW graph) stay off the event loop, and no search sees a half-built index.
+    """
+    async with faiss_index_locks[index_name]:
+        await asyncio.to_thread(update_faiss_index, index_name, new_embeddings, report_ids)
+
+async def locked_search_faiss_index(index_name: str, query_embeddings: np.ndarray, k: int = 5) -> Tuple[np.ndarray, List[List[str]]]:
+    """Runs search_faiss_index in a worker thread while holding the index's lock, so no add can overlap it."""
+    async with faiss_index_locks[index_name]:
+        return await asyncio.to_thread(search_faiss_index, index_name, query_embeddings, k)
+
+def extract_report_embeddings(subject_type: str, photos: List[bytes]):
+    """
+    Runs the image models for one report. Kept free of shared state so it can run in a worker process.
+    Text is embedded separately through embed_text_async so it can be batched with other reports.
+    Returns (face_embeddings, image_embedding) as (n, d) float32 arrays; either is empty if unavailable.
+    """
+    face_embeddings = as_embedding_matrix("face", [])
+    image_embedding = as_embedding_matrix("image", [])
+
+    if subject_type == "PERSON":
+        face_embeddings = get_face_embeddings(photos)
+        if len(face_embeddings) > 0:
+            print(f"Generated {len(face_embeddings)} face embeddings.")
+    
+    # Always try to get image embedding for general visual features if photos exist
+    if photos:
+        # For simplicity, use the first photo for image embedding if multiple exist
+        clip_embedding = get_image_embedding(photos[0])
+        if clip_embedding is not None:
+            image_embedding = clip_embedding
+            print("Generated CLIP image embedding.")
+
+    return face_embeddings, image_embedding
+
+async def embed_text_async(text: str) -> Optional[np.ndarray]:
+    """Queues a description for the text batcher and waits for its embedding."""
+    if text_embedding_queue is None:
+        raise RuntimeError("Matching workers not started. Call start_matching_workers() first.")
+    future = asyncio.get_running_loop().create_future()
+    await text_embedding_queue.put((text, future))
+    return await future
+
+async def _text_embedding_batcher():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await text_embedding_queue.get()]
+        deadline = loop.time() + TEXT_BATCH_WINDOW_SECONDS
+        while len(batch) < TEXT_BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(text_embedding_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        texts = [text for text, _ in batch]
+        try:
+            # The multilingual model needs no per-language setup, so reports in different languages share a batch
+            embeddings = await loop.run_in_executor(embedding_executor, get_text_embeddings, texts)
+        except Exception as e:
+            print(f"Error embedding batch of {len(texts)} texts: {e}")
+            embeddings = None
+        if embeddings is not None:
+            print(f"Generated {len(texts)} SBERT text embeddings in one batch.")
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(embeddings[i] if embeddings is not None else None)
+
 async def run_matching_job(report_id: str, report_data: dict, database): # Changed from supabase client to MongoDB database
     """
     Main matching job function.
@@ -137,187 +400,199 @@ async def run_matching_job(report_id: str, report_data: dict, database): # Chang
     report_type = report_data["type"] # LOST or FOUND
     subject_type = report_data["subject_type"] # PERSON or ITEM (using subject_type to align with Pydantic model)
     description_text = report_data["description_text"]
-    photo_urls = report_data["photo_urls"] # These are now base64 strings passed from main.py
+    photos = report_data.get("photos", []) # Raw image bytes, never base64 round-tripped
     
     # Extract location for the new report
     new_report_latitude = report_data["location"]["latitude"]
     new_report_longitude = report_data["location"]["longitude"]
 
     # --- 1. Extract Embeddings ---
-    face_embeddings = []
-    image_embedding = None
-    text_embedding = None
-
-    if subject_type == "PERSON":
-        face_embeddings = get_face_embeddings(photo_urls) # Use the base64 strings directly
-        if face_embeddings:
-            print(f"Generated {len(face_embeddings)} face embeddings.")
-    
-    # Always try to get image embedding for general visual features if photos exist
-    if photo_urls:
-        # For simplicity, use the first photo for image embedding if multiple exist
-        image_embedding = get_image_embedding(photo_urls[0])
-        if image_embedding is not None:
-            print("Generated CLIP image embedding.")
-        
-    if description_text:
-        text_embedding = get_text_embedding(description_text, report_data.get("language", "en"))
-        if text_embedding is not None:
-            print("Generated SBERT text embedding.")
-
-    # Convert to numpy arrays for FAISS
-    face_embeddings_np = np.array(face_embeddings).astype('float32') if face_embeddings else np.array([])
-    image_embedding_np = np.array(image_embedding).astype('float32') if image_embedding is not None else np.array([])
-    text_embedding_np = np.array(text_embedding).astype('float32') if text_embedding is not None else np.array([])
-
-    # Update FAISS indexes with the new report's embeddings
-    if face_embeddings_np.size > 0:
-        # Before adding, check if this report_id already has embeddings in the index.
-        # For simplicity, we assume new reports mean new embeddings. In a real system,
-        # you'd manage updates/deletes from the FAISS index.
-        update_faiss_index("face", face_embeddings_np, [report_id] * len(face_embeddings))
-    if image_embedding_np.size > 0:
-        update_faiss_index("image", np.expand_dims(image_embedding_np, axis=0), [report_id])
-    if text_embedding_np.size > 0:
-        update_faiss_index("text", np.expand_dims(text_embedding_np, axis=0), [report_id])
+    # Embedding models are CPU-bound, so run them off the event loop: the image models in a single executor hop,
+    # and the description through the shared text batcher at the same time
+    image_models = asyncio.get_running_loop().run_in_executor(
+        embedding_executor, extract_report_embeddings, subject_type, photos
+    )
+    text_model = embed_text_async(description_text) if description_text else asyncio.sleep(0, None)
+    (face_embeddings_np, image_embedding_np), text_embedding = await asyncio.gather(image_models, text_model)
+    # The embedding functions already return float32 arrays, so this is a reshape to (1, d), not a copy
+    text_embedding_np = as_embedding_matrix("text", text_embedding if text_embedding is not None else [])
+
+    # Update this report type's FAISS indexes with the new report's embeddings
+    new_embeddings = {"face": face_embeddings_np, "image": image_embedding_np, "text": text_embedding_np}
+    for modality, embeddings in new_embeddings.items():
+        if embeddings.size > 0:
+            # Before adding, check if this report_id already has embeddings in the index.
+            # For simplicity, we assume new reports mean new embeddings. In a real system,
+            # you'd manage updates/deletes from the FAISS index.
+            index_name = faiss_index_name(modality, report_type)
+            await locked_update_faiss_index(index_name, embeddings, [report_id] * len(embeddings))
 
     # --- 2. Search Existing FAISS Indexes ---
-    # This part needs to be more sophisticated to only search against reports of the opposite type.
-    # For a prototype, we'll search all available embeddings and filter later.
-    
-    candidate_matches = {} # Using a dict to easily update scores for a given other_report_id
-
-    # Search logic (simplified):
+    # Only the opposite type's indexes are searched, so every hit is already a LOST/FOUND pair
+    opposite_type = "FOUND" if report_type == "LOST" else "LOST"
+    search_queries = {}
     if subject_type == "PERSON" and face_embeddings_np.size > 0:
-        # Search all existing face embeddings (which might be from LOST or FOUND reports)
-        # We need to ensure we only match against opposite report types.
-        # This requires fetching metadata for matched_ids, which `search_faiss_index` doesn't provide directly.
-        # For prototype, we proceed with general search and filter later.
-
-        for query_face_emb in face_embeddings_np: # For each face in the new report
-            scores, matched_ids_from_faiss = search_faiss_index("face", query_face_emb, k=10)
-            
-            for i, other_report_id in enumerate(matched_ids_from_faiss):
-                if other_report_id == report_id: # Don't match a report to itself
-                    continue
-                
-                # Check if the other_report_id is of the opposite type
-                # Fetch other report details from MongoDB
-                other_report_doc = await database["reports"].find_one({"_id": ObjectId(other_report_id)}) # Use ObjectId
-                if other_report_doc and other_report_doc["type"] != report_type:
-                    current_face_score = scores[i]
-                    if other_report_id not in candidate_matches:
-                        candidate_matches[other_report_id] = {"face_score": current_face_score}
-                    else:
-                        candidate_matches[other_report_id]["face_score"] = max(
-                            candidate_matches[other_report_id].get("face_score", 0.0), current_face_score
-                        )
-
+        # Search every face in the new report in one batched call
+        search_queries["face"] = face_embeddings_np
     if image_embedding_np.size > 0:
-        scores, matched_ids_from_faiss = search_faiss_index("image", image_embedding_np, k=10)
-        for i, other_report_id in enumerate(matched_ids_from_faiss):
-            if other_report_id == report_id:
-                continue
-
-            other_report_doc = await database["reports"].find_one({"_id": ObjectId(other_report_id)}) # Use ObjectId
-            if other_report_doc and other_report_doc["type"] != report_type:
-                current_img_score = scores[i]
-                if other_report_id not in candidate_matches:
-                    candidate_matches[other_report_id] = {"image_score": current_img_score}
-                else:
-                    candidate_matches[other_report_id]["image_score"] = max(
-                        candidate_matches[other_report_id].get("image_score", 0.0), current_img_score
-                    )
-
+        search_queries["image"] = image_embedding_np
     if text_embedding_np.size > 0:
-        scores, matched_ids_from_faiss = search_faiss_index("text", text_embedding_np, k=10)
-        for i, other_report_id in enumerate(matched_ids_from_faiss):
-            if other_report_id == report_id:
-                continue
-
-            other_report_doc = await database["reports"].find_one({"_id": ObjectId(other_report_id)}) # Use ObjectId
-            if other_report_doc and other_report_doc["type"] != report_type:
-                current_text_score = scores[i]
-                if other_report_id not in candidate_matches:
-                    candidate_matches[other_report_id] = {"text_score": current_text_score}
-                else:
-                    candidate_matches[other_report_id]["text_score"] = max(
-                        candidate_matches[other_report_id].get("text_score", 0.0), current_text_score
-                    )
+        search_queries["text"] = text_embedding_np
+
+    # Run the modality searches concurrently off the event loop; FAISS releases the GIL while searching
+    search_results = await asyncio.gather(*(
+        locked_search_faiss_index(faiss_index_name(modality, opposite_type), query_embeddings, 10)
+        for modality, query_embeddings in search_queries.items()
+    ))
+    modality_hits = dict(zip(search_queries, search_results)) # modality -> ((nq, k) scores, per-query matched report IDs)
+
+    # Fetch location for every hit in one query instead of a find_one per hit
+    hit_report_ids = {
+        other_report_id
+        for _, matched_ids in modality_hits.values()
+        for matched_ids_from_faiss in matched_ids
+        for other_report_id in matched_ids_from_faiss
+        if other_report_id != report_id # Don't match a report to itself
+    }
+    other_reports = {}
+    if hit_report_ids:
+        async for other_report_doc in database["reports"].find(
+            {"_id": {"$in": [ObjectId(other_report_id) for other_report_id in hit_report_ids]}},
+            projection={"location": 1},
+        ):
+            other_reports[str(other_report_doc["_id"])] = other_report_doc
+
+    candidate_matches = {} # Using a dict to easily update scores for a given other_report_id
+    for modality, (scores, matched_ids) in modality_hits.items():
+        # Best score per distinct report across all query vectors, as a NumPy scatter-max
+        flat_ids = np.array([other_report_id for row in matched_ids for other_report_id in row])
+        if flat_ids.size == 0:
+            continue
+        flat_scores = np.concatenate([row_scores[:len(row)] for row_scores, row in zip(scores, matched_ids)])
+        unique_ids, inverse = np.unique(flat_ids, return_inverse=True)
+        best_scores = np.full(len(unique_ids), -np.inf, dtype=np.float32)
+        np.maximum.at(best_scores, inverse, flat_scores)
+
+        # tolist() yields plain str/float, since numpy scalars aren't BSON-encodable
+        for other_report_id, score in zip(unique_ids.tolist(), best_scores.tolist()):
+            # Skip hits whose report has since been deleted
+            if other_report_id in other_reports:
+                candidate_matches.setdefault(other_report_id, {})[f"{modality}_score"] = score
     
     # --- 3. Calculate Fused Scores and Persist ---
-    for other_report_id, scores_dict in candidate_matches.items():
-        face_score = scores_dict.get("face_score", 0.0)
-        image_score = scores_dict.get("image_score", 0.0)
-        text_score = scores_dict.get("text_score", 0.0)
-
-        # Fetch location data for the other report
-        other_report_doc = await database["reports"].find_one({"_id": ObjectId(other_report_id)})
-        
-        distance_score = 0.0
-        if other_report_doc and "location" in other_report_doc and \
-           "latitude" in other_report_doc["location"] and "longitude" in other_report_doc["location"]:
-            
-            other_report_latitude = other_report_doc["location"]["latitude"]
-            other_report_longitude = other_report_doc["location"]["longitude"]
-
-            distance_km = haversine_distance(
-                new_report_latitude, new_report_longitude,
-                other_report_latitude, other_report_longitude
-            )
-            print(f"Distance between reports {report_id} and {other_report_id}: {distance_km:.2f} km")
-
-            # Simple distance scoring: closer is better.
-            # Example: 1.0 for 0km, 0.0 for 10km, linearly interpolating.
-            # You can make this more sophisticated (e.g., inverse square, exponential decay).
-            MAX_DISTANCE_FOR_SCORE = 5.0 # km - reports further than this get 0 distance score
-            if distance_km < MAX_DISTANCE_FOR_SCORE:
-                distance_score = 1.0 - (distance_km / MAX_DISTANCE_FOR_SCORE)
-            else:
-                distance_score = 0.0
-            
-            print(f"Distance score: {distance_score:.2f}")
-
-        # Integrate distance score into fused score
-        # Adjust weights as needed. Total weights should sum to 1.0 if using as a direct component.
-        # For simplicity, we'll give it a small weight initially.
-        FUSED_WEIGHTS = {"face": 0.5, "image": 0.3, "text": 0.1, "distance": 0.1} # New weights
-        
-        fused_score = (
-            face_score * FUSED_WEIGHTS["face"] +
-            image_score * FUSED_WEIGHTS["image"] +
-            text_score * FUSED_WEIGHTS["text"] +
-            distance_score * FUSED_WEIGHTS["distance"]
-        )
-        # Ensure fused_score is capped at 1.0 if individual scores can exceed 1.0 or weights are high
-        fused_score = min(1.0, fused_score)
-
-        threshold = PERSON_MATCH_THRESHOLD if subject_type == "PERSON" else ITEM_MATCH_THRESHOLD
-
-        if fused_score > threshold:
-            match_id = str(uuid.uuid4()) # Generate unique ID for the match
-            
-            # Determine which report is lost and which is found for the match entry
-            current_report_is_lost = (report_type == "LOST")
-            
-            new_match_entry = {
-                "_id": ObjectId(), # Use ObjectId for MongoDB primary key
-                "lost_report_id": report_id if current_report_is_lost else other_report_id,
-                "found_report_id": other_report_id if current_report_is_lost else report_id,
-                "scores": {"face": face_score, "image": image_score, "text": text_score, "distance": distance_score}, # Include distance score
-                "fused_score": fused_score,
-                "status": "PENDING",
-                "created_at": datetime.utcnow()
-            }
-            # Insert into MongoDB
-            insert_response = await database["matches"].insert_one(new_match_entry)
-            if insert_response.inserted_id:
-                print(f"Persisted match {insert_response.inserted_id}: {new_match_entry}")
-                # Send real-time notification about the new match
-                await manager.broadcast(f"New match found for report {report_id}: {insert_response.inserted_id}")
-            else:
-                print(f"Failed to persist match: {insert_response.acknowledged}") # Use acknowledged for insert_one
+    matched_at = datetime.now(timezone.utc) # One timestamp for every match this job creates
+    new_match_entries = []
+    candidate_ids = list(candidate_matches)
+    if not candidate_ids: # Nothing was searched (no photos or description) or nothing came back
+        return {"message": f"Matching job completed for report {report_id}"}
+
+    # Location data for the candidates was fetched with the batched lookup above; a missing location is NaN
+    candidate_locations = [other_reports[other_report_id].get("location") or {} for other_report_id in candidate_ids]
+    candidate_lats = np.fromiter((location.get("latitude", np.nan) for location in candidate_locations), dtype=np.float64, count=len(candidate_ids))
+    candidate_lons = np.fromiter((location.get("longitude", np.nan) for location in candidate_locations), dtype=np.float64, count=len(candidate_ids))
+    distances_km = haversine_np(new_report_latitude, new_report_longitude, candidate_lats, candidate_lons)
+
+    # Simple distance scoring: closer is better.
+    # Example: 1.0 for 0km, 0.0 for MAX_DISTANCE_FOR_SCORE km or more (or no location), linearly interpolating.
+    # You can make this more sophisticated (e.g., inverse square, exponential decay).
+    with np.errstate(invalid="ignore"): # NaN distances compare False and score 0
+        distance_scores = np.where(distances_km < MAX_DISTANCE_FOR_SCORE, 1.0 - distances_km / MAX_DISTANCE_FOR_SCORE, 0.0)
+    for other_report_id, distance_km, distance_score in zip(candidate_ids, distances_km.tolist(), distance_scores.tolist()):
+        print(f"Distance between reports {report_id} and {other_report_id}: {distance_km:.2f} km (score {distance_score:.2f})")
+
+    # Fuse and threshold every candidate at once: one (n, 4) x (4,) product instead of a per-candidate formula
+    modality_scores = np.array(
+        [
+            [candidate_matches[other_report_id].get(f"{modality}_score", 0.0) for modality in FUSED_MODALITIES]
+            for other_report_id in candidate_ids
+        ],
+        dtype=np.float32,
+    ).reshape(-1, len(FUSED_MODALITIES))
+    candidate_scores = np.column_stack((modality_scores, distance_scores)).astype(np.float32)
+    # Modalities this report has no embedding for (e.g. faces on an ITEM report) drop out of the fusion, and the
+    # remaining content weights are renormalized so such reports can still reach the thresholds. Distance keeps
+    # its fixed weight, so proximity alone can never carry a weak content match over the threshold
+    modality_present = np.array([modality in modality_hits for modality in FUSED_MODALITIES])
+    content_weights = FUSED_WEIGHT_VECTOR[:-1] * modality_present
+    content_weights *= (1.0 - FUSED_WEIGHTS["distance"]) / content_weights.sum() # Every candidate came from a searched modality, so the sum is > 0
+    fused_weights = np.append(content_weights, FUSED_WEIGHTS["distance"]).astype(np.float32)
+    # Ensure fused_score is capped at 1.0 if individual scores can exceed 1.0 or weights are high
+    fused_scores = np.minimum(1.0, candidate_scores @ fused_weights)
+
+    threshold = PERSON_MATCH_THRESHOLD if subject_type == "PERSON" else ITEM_MATCH_THRESHOLD
+    # Determine which report is lost and which is found for the match entry
+    current_report_is_lost = (report_type == "LOST")
+
+    for candidate_index in np.flatnonzero(fused_scores > threshold).tolist():
+        other_report_id = candidate_ids[candidate_index]
+        *modality_scores_row, distance_score = candidate_scores[candidate_index].tolist()
+        # Modalities that weren't searched are stored as None rather than a 0.0 that reads like a failed comparison
+        match_scores = {
+            modality: (score if present else None)
+            for modality, score, present in zip(FUSED_MODALITIES, modality_scores_row, modality_present.tolist())
+        }
+        new_match_entry = {
+            "_id": ObjectId(), # Use ObjectId for MongoDB primary key
+            "lost_report_id": report_id if current_report_is_lost else other_report_id,
+            "found_report_id": other_report_id if current_report_is_lost else report_id,
+            "scores": {**match_scores, "distance": distance_score}, # Include distance score
+            "fused_score": float(fused_scores[candidate_index]),
+            "status": "PENDING",
+            "created_at": matched_at
+        }
+        new_match_entries.append(new_match_entry)
+
+    # Persist all matches in one round-trip, then notify clients concurrently
+    if new_match_entries:
+        await database["matches"].insert_many(new_match_entries, ordered=False) # Independent docs; don't stop at the first error
+        for new_match_entry in new_match_entries:
+            print(f"Persisted match {new_match_entry['_id']}: {new_match_entry}")
+        # Send real-time notification about the new matches
+        await asyncio.gather(*(
+            manager.broadcast(f"New match found for report {report_id}: {new_match_entry['_id']}")
+            for new_match_entry in new_match_entries
+        ))
     
     # Return a message indicating the job is done, or a list of new match IDs
     return {"message": f"Matching job completed for report {report_id}"}
 
+async def enqueue_matching_job(report_id: str, report_data: dict, database):
+    """Queues a matching job for the background workers instead of running it on the request path."""
+    if matching_queue is None:
+        raise RuntimeError("Matching workers not started. Call start_matching_workers() first.")
+    await matching_queue.put((report_id, report_data, database))
+
+async def _matching_worker():
+    while True:
+        report_id, report_data, database = await matching_queue.get()
+        try:
+            await run_matching_job(report_id, report_data, database)
+        except Exception as e:
+            print(f"Matching job failed for report {report_id}: {e}")
+        finally:
+            matching_queue.task_done()
+
+def start_matching_workers(num_workers: int = MATCHING_WORKERS):
+    global matching_queue, text_embedding_queue, embedding_executor
+    matching_queue = asyncio.Queue()
+    text_embedding_queue = asyncio.Queue()
+    if EMBEDDING_PROCESSES > 0:
+        # Spawn rather than fork so each worker loads its own copy of the models cleanly
+        embedding_executor = ProcessPoolExecutor(
+            max_workers=EMBEDDING_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    for _ in range(num_workers):
+        matching_worker_tasks.append(asyncio.create_task(_matching_worker()))
+    matching_worker_tasks.append(asyncio.create_task(_text_embedding_batcher()))
+    matching_worker_tasks.append(asyncio.create_task(_faiss_flush_loop()))
+
+async def stop_matching_workers():
+    for task in matching_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*matching_worker_tasks, return_exceptions=True)
+    matching_worker_tasks.clear()
+    await flush_faiss_indexes() # Persist whatever was added since the last periodic save
+    global embedding_executor
+    if embedding_executor is not None:
+        embedding_executor.shutdown(wait=False, cancel_futures=True)
+        embedding_executor = None
@@ -1,10 +1,12 @@
 # backend/models/schemas.py
 
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 from typing import List, Optional, Literal, Any
 
 from pydantic import BaseModel, Field
 from bson import ObjectId # Re-added MongoDB ObjectId import
+from bson.errors import InvalidId
 
 # Custom PyObjectId class for MongoDB ObjectIds
 class PyObjectId(ObjectId):
@@ -14,9 +16,15 @@ class PyObjectId(ObjectId):
 
     @classmethod
     def validate(cls, v, info: Any):
-        if not ObjectId.is_valid(v):
+        if isinstance(v, ObjectId):
+            return v # Already parsed, e.g. straight from MongoDB
+        if v is None:
+            raise ValueError("Invalid ObjectId") # ObjectId(None) would generate a fresh ID
+        # ObjectId() validates as it parses, so don't check with is_valid and then parse again
+        try:
+            return ObjectId(v)
+        except (InvalidId, TypeError):
             raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
 
     # Corrected for Pydantic V2: Use __get_pydantic_json_schema__
     @classmethod
@@ -25,12 +33,21 @@ class PyObjectId(ObjectId):
         json_schema.update(type="string")
         return json_schema
 
-class PersonSchema(BaseModel):
+class MongoDocumentSchema(BaseModel):
+    """Base for models stored as MongoDB documents: the _id field and ObjectId-friendly config, declared once."""
     id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+
+    # Reverted to Pydantic V1 Config for ObjectId serialization
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class PersonSchema(MongoDocumentSchema):
     name: Optional[str] = Field(None, description="Name of the person")
     age: Optional[int] = Field(None, description="Age of the person")
     language: str = Field(..., description="Primary language of the person")
-    photo_ids: List[str] = Field([], description="GridFS IDs of stored photos of the person") # Changed description
+    photo_ids: List[str] = Field(default_factory=list, description="GridFS IDs of stored photos of the person") # Changed description
     qr_id: Optional[str] = Field(None, description="QR code ID if registered")
     guardian_contact: Optional[str] = Field(None, description="Contact information for guardian")
     is_child: Optional[bool] = Field(None, description="Indicates if the person is a child (under 18)")
@@ -39,94 +56,70 @@ class PersonSchema(BaseModel):
     identifying_features: Optional[str] = Field(None, description="Distinctive features (e.g., birthmarks, scars)")
     clothing_description: Optional[str] = Field(None, description="Description of clothing worn by the person")
 
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
-
-class ItemSchema(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+class ItemSchema(MongoDocumentSchema):
     type: str = Field(..., description="Type of item (e.g., 'bag', 'phone')")
     color: str = Field(..., description="Color of the item")
     brand: Optional[str] = Field(None, description="Brand of the item")
-    photo_ids: List[str] = Field([], description="GridFS IDs of stored photos of the item") # Changed description
+    photo_ids: List[str] = Field(default_factory=list, description="GridFS IDs of stored photos of the item") # Changed description
     qr_id: Optional[str] = Field(None, description="QR code ID if registered")
 
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
-
 class LocationDataSchema(BaseModel):
     latitude: float = Field(..., description="Latitude of the location")
     longitude: float = Field(..., description="Longitude of the location")
     description: Optional[str] = Field(None, description="Human-readable description of the location")
 
-class ReportSchema(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+class ReportSchema(MongoDocumentSchema):
     type: Literal["LOST", "FOUND"] = Field(..., description="Type of report")
     subject_type: Literal["PERSON", "ITEM"] = Field(..., alias="subject", description="Subject type of the report")
     ref_ids: List[str] = Field(..., alias="refs", description="List of person_id or item_id associated with the report")
     description_text: str = Field(..., alias="desc_text", description="Description text of the lost/found item/person")
     language: str = Field(..., description="Language of the description") # Changed: Removed alias="lang"
-    photo_ids: List[str] = Field([], description="GridFS IDs of stored photos for the report") # Changed description
+    photo_ids: List[str] = Field(default_factory=list, description="GridFS IDs of stored photos for the report") # Changed description
     location: LocationDataSchema = Field(..., description="Location where the person/item was lost/found")
     status: Literal["OPEN", "MATCHED", "REUNITED", "CLOSED"] = Field("OPEN", description="Status of the report")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of report creation")
-    photo_urls: List[str] = Field([], description="List of URLs for report photos")
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), description="Timestamp of report creation")
+    photo_urls: List[str] = Field(default_factory=list, description="List of URLs for report photos")
     posted_by_contact: Optional[str] = Field(None, description="Contact of the user who posted the report")
     person_details: Optional[PersonSchema] = Field(None, description="Detailed information for a lost/found person")
 
-    # Reverted to Pydantic V1 Config for ObjectId serialization
+class ReportCreateSchema(BaseModel):
+    type: Literal["LOST", "FOUND"] = Field(..., description="Type of report")
+    subject_type: Literal["PERSON", "ITEM"] = Field(..., alias="subject", description="Subject type of the report")
+    ref_ids: List[str] = Field(..., alias="refs", description="List of person_id or item_id associated with the report")
+    description_text: str = Field(..., alias="desc_text", description="Description text of the lost/found item/person")
+    language: str = Field(..., description="Language of the description")
+    location: LocationDataSchema = Field(..., description="Location where the person/item was lost/found")
+
     class Config:
         populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
 
-class EmbeddingSchema(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+class EmbeddingSchema(MongoDocumentSchema):
     report_id: str = Field(..., description="ID of the associated report")
-    face_vecs: List[List[float]] = Field([], description="List of face embedding vectors")
+    face_vecs: List[List[float]] = Field(default_factory=list, description="List of face embedding vectors")
     image_vec: Optional[List[float]] = Field(None, description="CLIP image embedding vector")
     text_vec: Optional[List[float]] = Field(None, description="Sentence-transformer text embedding vector")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of embedding creation")
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), description="Timestamp of embedding creation")
 
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+class ModalityScores(BaseModel):
+    face: Optional[float] = Field(None, description="Best face similarity")
+    image: Optional[float] = Field(None, description="CLIP image similarity")
+    text: Optional[float] = Field(None, description="Description text similarity")
+    distance: Optional[float] = Field(None, description="Distance score, 1.0 at the same spot")
 
-class MatchSchema(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+class MatchSchema(MongoDocumentSchema):
     lost_report_id: str = Field(..., description="ID of the lost report")
     found_report_id: str = Field(..., description="ID of the found report")
-    scores: dict = Field(..., description="Dictionary of individual modality scores (face, image, text, distance)")
+    scores: ModalityScores = Field(..., description="Individual modality scores (face, image, text, distance)")
     fused_score: float = Field(..., description="Weighted average of modality scores")
     status: Literal["PENDING", "CONFIRMED_REUNITED", "FALSE_MATCH"] = Field("PENDING", description="Status of the match")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of match creation")
-
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), description="Timestamp of match creation")
 
-class UserSchema(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
+class UserSchema(MongoDocumentSchema):
     role: Literal["VOLUNTEER", "ADMIN"] = Field(..., description="Role of the user")
     contact: str = Field(..., description="Phone number or email for mock alerts")
     consent_face_qr: bool = Field(False, description="User consent for facial recognition and QR tagging")
     hashed_refresh_token: Optional[str] = Field(None, description="Hashed refresh token for persistent sessions")
 
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
-
 class UserRegisterSchema(BaseModel):
     contact: str = Field(..., description="Phone number or email for user account")
     password: str = Field(..., description="User's password")
@@ -139,18 +132,11 @@ class UserRegisterSchema(BaseModel):
         arbitrary_types_allowed = True
 
 
-class NotificationLogEntry(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id") # Reverted to MongoDB-specific ID
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+class NotificationLogEntry(MongoDocumentSchema):
+    timestamp: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
     match_id: Optional[str] = None
     report_id: Optional[str] = None
     recipient: str
     message: str
     type: Literal["SMS", "CALL"]
     status: Literal["SIMULATED_SENT", "FAILED"] = "SIMULATED_SENT"
-
-    # Reverted to Pydantic V1 Config for ObjectId serialization
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
@@ -0,0 +1,44 @@
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+import core.database as database
+
+
+class _FakeCollection:
+    def __init__(self, name, created, fail_unique_on):
+        self.name = name
+        self.created = created
+        self.fail_unique_on = fail_unique_on
+
+    async def create_index(self, keys, **kwargs):
+        if kwargs.get("unique") and (self.name, keys) in self.fail_unique_on:
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.created.append((self.name, keys))
+
+
+class _FakeDatabase:
+    def __init__(self, fail_unique_on=()):
+        self.created = []
+        self.fail_unique_on = set(fail_unique_on)
+
+    def __getitem__(self, name):
+        return _FakeCollection(name, self.created, self.fail_unique_on)
+
+
+def test_duplicate_contacts_do_not_block_startup(monkeypatch):
+    monkeypatch.setattr(database, "users_contact_unique", True)
+    db = _FakeDatabase(fail_unique_on=[("users", "contact")])
+
+    asyncio.run(database.ensure_indexes(db))
+
+    assert database.users_contact_unique is False
+    assert ("users", "contact") not in db.created
+    assert ("users", "hashed_refresh_token") in db.created
+    assert ("reports", [("type", 1), ("status", 1), ("_id", -1)]) in db.created
+
+
+def test_unique_contact_index_is_recorded(monkeypatch):
+    monkeypatch.setattr(database, "users_contact_unique", False)
+    asyncio.run(database.ensure_indexes(_FakeDatabase()))
+    assert database.users_contact_unique is True
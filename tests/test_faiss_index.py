@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import ml.matcher as matcher
+
+DIMENSION = 32
+
+
+def _random_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def faiss_state(tmp_path, monkeypatch):
+    """Points the matcher at an empty index directory and fresh in-memory index state."""
+    monkeypatch.setattr(matcher, "FAISS_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(matcher, "faiss_indexes", {})
+    monkeypatch.setattr(matcher, "faiss_report_ids", {})
+    monkeypatch.setattr(matcher, "faiss_unsaved_additions", {})
+    return tmp_path
+
+
+@pytest.mark.parametrize("index_type", ["Flat", "SQfp16", "HNSW32,SQ8", "IVF4,Flat"])
+def test_initialized_index_owns_its_memory(index_type):
+    index = matcher.initialize_faiss_index(DIMENSION, index_type)
+    assert index.d == DIMENSION
+    vectors = _random_vectors(200)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    distances, labels = index.search(vectors[:3], 1)
+    assert labels[:, 0].tolist() == [0, 1, 2]
+    assert np.allclose(distances[:, 0], 1.0, atol=1e-2)
+
+
+def test_add_and_search_roundtrip(faiss_state):
+    matcher.load_or_create_faiss_index("text_LOST", DIMENSION)
+    vectors = _random_vectors(5)
+    report_ids = [f"report-{i}" for i in range(5)]
+    matcher.update_faiss_index("text_LOST", vectors, report_ids)
+
+    distances, matched_ids = matcher.search_faiss_index("text_LOST", vectors[2], k=2)
+    assert matched_ids[0][0] == "report-2"
+    assert distances[0][0] == pytest.approx(1.0, abs=1e-2)
+
+
+@pytest.mark.parametrize("index_type", ["HNSW32,SQ8", "IVF4,Flat"])
+def test_rebuilt_index_keeps_report_ids(faiss_state, index_type):
+    matcher.load_or_create_faiss_index("image_FOUND", DIMENSION)
+    vectors = _random_vectors(300, seed=1)
+    report_ids = [f"report-{i}" for i in range(300)]
+    matcher.update_faiss_index("image_FOUND", vectors, report_ids)
+
+    rebuilt = matcher.train_faiss_index(matcher.faiss_indexes["image_FOUND"], index_type)
+    matcher.faiss_indexes["image_FOUND"] = rebuilt
+    assert rebuilt.ntotal == 300
+
+    _, matched_ids = matcher.search_faiss_index("image_FOUND", vectors[7], k=1)
+    assert matched_ids[0] == ["report-7"]
+
+
+def test_locked_update_rebuilds_as_hnsw(faiss_state, monkeypatch):
+    monkeypatch.setattr(matcher, "faiss_index_locks", matcher.defaultdict(matcher.asyncio.Lock))
+    monkeypatch.setattr(matcher, "FAISS_HNSW_MIN_VECTORS", 100)
+    matcher.load_or_create_faiss_index("text_LOST", DIMENSION)
+    vectors = _random_vectors(150, seed=2)
+    report_ids = [f"report-{i}" for i in range(150)]
+
+    async def add_then_search():
+        await matcher.locked_update_faiss_index("text_LOST", vectors, report_ids)
+        return await matcher.locked_search_faiss_index("text_LOST", vectors[42], k=1)
+
+    _, matched_ids = matcher.asyncio.run(add_then_search())
+    rebuilt = matcher.faiss_indexes["text_LOST"]
+    assert isinstance(matcher.faiss.downcast_index(rebuilt.index), matcher.faiss.IndexHNSW)
+    assert rebuilt.ntotal == 150
+    assert matched_ids[0] == ["report-42"]
+
+
+def test_flush_writes_unsaved_indexes(faiss_state, monkeypatch):
+    monkeypatch.setattr(matcher, "faiss_index_locks", matcher.defaultdict(matcher.asyncio.Lock))
+    matcher.load_or_create_faiss_index("face_FOUND", DIMENSION)
+    matcher.update_faiss_index("face_FOUND", _random_vectors(3), ["a", "b", "c"])
+
+    matcher.asyncio.run(matcher.flush_faiss_indexes())
+    assert matcher.faiss_unsaved_additions["face_FOUND"] == 0
+
+    matcher.faiss_indexes.clear()
+    reloaded = matcher.load_or_create_faiss_index("face_FOUND", DIMENSION)
+    assert reloaded.ntotal == 3
+    assert sorted(matcher.faiss_report_ids["face_FOUND"].values()) == ["a", "b", "c"]
+
+
+
+def test_bare_index_without_id_map_is_recreated(faiss_state):
+    bare_index = matcher.faiss.IndexFlatIP(DIMENSION)
+    bare_index.add(_random_vectors(4))
+    matcher.faiss.write_index(bare_index, str(faiss_state / "text_LOST_index.faiss"))
+
+    index = matcher.load_or_create_faiss_index("text_LOST", DIMENSION)
+    assert isinstance(index, matcher.faiss.IndexIDMap2)
+    assert index.ntotal == 0
+    assert matcher.faiss_report_ids["text_LOST"] == {}
@@ -0,0 +1,22 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routers import matches, reports
+
+app = FastAPI()
+app.include_router(reports.router)
+app.include_router(matches.router)
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("method, path, detail", [
+    ("get", "/reports/not-an-id", "Invalid report ID format"),
+    ("delete", "/reports/not-an-id", "Invalid report ID format"),
+    ("get", "/reports/images/not-an-id", "Invalid file ID format"),
+    ("post", "/match/run/not-an-id", "Invalid report ID format"),
+])
+def test_malformed_ids_are_rejected_with_400(method, path, detail):
+    response = client.request(method, path)
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
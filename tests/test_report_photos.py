@@ -0,0 +1,39 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+import api.routers.reports as reports
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="photo.jpg", headers=Headers({"content-type": "image/jpeg"}))
+
+
+def test_oversized_photo_stores_nothing(monkeypatch):
+    stored = []
+
+    async def fake_store(photo_bytes, filename, content_type):
+        stored.append(filename)
+        return "file-id"
+
+    monkeypatch.setattr(reports, "MAX_PHOTO_BYTES", 8)
+    monkeypatch.setattr(reports, "store_image_in_gridfs", fake_store)
+    photos = [_upload(b"small"), _upload(b"far too large")]
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(reports._store_photos(photos))
+    assert excinfo.value.status_code == 413
+    assert stored == []
+
+
+def test_photos_are_stored_in_order(monkeypatch):
+    async def fake_store(photo_bytes, filename, content_type):
+        return photo_bytes.decode()
+
+    monkeypatch.setattr(reports, "store_image_in_gridfs", fake_store)
+    photo_ids, photo_bytes = asyncio.run(reports._store_photos([_upload(b"first"), _upload(b"second")]))
+    assert photo_ids == ["first", "second"]
+    assert photo_bytes == [b"first", b"second"]
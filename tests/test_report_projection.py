@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from api.routers.reports import REPORT_LIST_ADAPTER, REPORT_PROJECTION
+
+
+def _stored_report():
+    """A report as create_report writes it to MongoDB."""
+    return {
+        "_id": ObjectId(),
+        "type": "LOST",
+        "subject": "ITEM",
+        "refs": ["item-1"],
+        "description_text": "Blue backpack with a laptop inside",
+        "language": "en",
+        "photo_ids": [],
+        "location": {"latitude": 12.97, "longitude": 77.59, "description": "Central station"},
+        "status": "OPEN",
+        "created_at": datetime.now(timezone.utc),
+        "posted_by_contact": None,
+        "person_details": None,
+        "embedding_ids": ["not-part-of-the-schema"],
+    }
+
+
+def test_projection_keeps_every_stored_schema_field():
+    stored = _stored_report()
+    projected = {key: value for key, value in stored.items() if key in REPORT_PROJECTION}
+    assert "embedding_ids" not in projected
+
+    [report] = REPORT_LIST_ADAPTER.validate_python([projected])
+    assert report.description_text == stored["description_text"]
+    assert report.subject_type == "ITEM"
+    assert report.ref_ids == ["item-1"]
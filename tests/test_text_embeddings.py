@@ -0,0 +1,28 @@
+import numpy as np
+
+import ml.embeddings as embeddings
+
+
+class _FakeSbert:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        vectors = np.random.default_rng(len(texts)).standard_normal((len(texts), 8)).astype(np.float32)
+        self.last = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self.last
+
+
+def test_text_embeddings_keep_full_precision(monkeypatch):
+    model = _FakeSbert()
+    monkeypatch.setattr(embeddings, "sbert_model", model)
+    monkeypatch.setattr(embeddings, "text_embedding_cache", embeddings.LRUCache(maxsize=16))
+
+    first = embeddings.get_text_embeddings(["black iPhone", "red umbrella"])
+    assert first.dtype == np.float32
+    assert np.array_equal(first, model.last)
+
+    again = embeddings.get_text_embeddings(["red umbrella", "black iPhone"])
+    assert model.calls == 1
+    assert np.array_equal(again, first[::-1])